@@ -7,7 +7,9 @@ import superjson
 from ExperimentManager.global_manager import global_manager
 from ExperimentManager.experiment import ExperimentManager
 from ExperimentManager.utils import pprint_dict
-from ExperimentManager.timer import get_timer
+from ExperimentManager.timer import get_timer, get_profiler
+from ExperimentManager.pruning import MedianPruner, SuccessiveHalvingPruner, RunPruned
+from ExperimentManager.ledger import LedgerReader, read_ledger
 
 
 def getManager(name = None,experiments_dir = None, project_dir = None, verbose = 1, **kwargs):
@@ -51,7 +53,7 @@ def getManagerFromConfig(config_file):
     experiments_dir = None if not 'experiments_dir' in config else config['experiments_dir']
     verbose = True if not 'verbose' in config else config['verbose']
     
-    kwargs = {  key:config[key] for key in ['skip_dirs','ghost','load_dir','tensorboard','gpu_options'] if key in config }
+    kwargs = {  key:config[key] for key in ['skip_dirs','ghost','load_dir','tensorboard','gpu_options','async_logging','max_open_files','metrics_format','metrics_buffer_size','trace','profile','sample','sampling_interval','memory','memory_top','memory_threshold','resources','resources_interval','save_sources','catalog','catalog_wal','multiprocess','versioning'] if key in config }
     manager = ExperimentManager(name,experiments_dir = experiments_dir, project_dir = project_dir, verbose = verbose, **kwargs)
 
     # Adding the entry in the global manager
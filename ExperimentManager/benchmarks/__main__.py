@@ -0,0 +1,109 @@
+''' Run the benchmark suite and compare the results to a baseline.
+
+Run with : python -m ExperimentManager.benchmarks [--only case ...] [--repeat 5] [--output results.json] [--baseline baseline.json] [--save-baseline] [--tolerance 0.25] [--check]
+
+Every case is a module of this package with a run(repeat) function returning {name : value} and a UNIT, all values are times (lower is better).
+Results are written as json ({'environment' : ..., 'results' : {'case/name' : {'value', 'unit'}}}). They are compared to the baseline (baseline.json next to this file by default) : values more than tolerance slower than the baseline are reported as regressions, and --check makes them fail the command.
+Baselines depend on the machine, use --save-baseline to record one before comparing changes.
+'''
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+
+CASES = ['import_time', 'startup', 'metrics_throughput', 'capture_overhead', 'get_options', 'saving', 'call_id', 'stdout_capture']
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def run_cases(cases, repeat):
+	results = {}
+	for case in cases:
+		module = importlib.import_module('ExperimentManager.benchmarks.{}'.format(case))
+		start = time.perf_counter()
+		for name, value in module.run(repeat = repeat).items():
+			results['{}/{}'.format(case, name)] = { 'value' : value, 'unit' : module.UNIT }
+		print('{} done in {:.1f} s'.format(case, time.perf_counter() - start), file = sys.stderr)
+	return results
+
+def environment():
+	return {
+		'python' : platform.python_version(),
+		'implementation' : platform.python_implementation(),
+		'platform' : platform.platform(),
+		'machine' : platform.machine(),
+		'cpus' : os.cpu_count(),
+		'date' : time.strftime('%Y-%m-%d %H:%M:%S'),
+	}
+
+def compare(results, baseline, tolerance):
+	''' Print the results next to the baseline.
+
+	# Returns
+		- the list of names of the regressions
+	'''
+	regressions = []
+	print('{:<70} {:>12} {:>12} {:>8}'.format('benchmark', 'value', 'baseline', 'ratio'))
+	for name, result in results.items():
+		reference = baseline.get(name)
+		if reference is None:
+			print('{:<70} {:>12.4g} {:>12} {:>8}   {}'.format(name, result['value'], '-', '-', result['unit']))
+			continue
+		ratio = result['value'] / reference['value'] if reference['value'] > 0 else float('inf')
+		flag = ''
+		if ratio > 1 + tolerance:
+			flag = ' REGRESSION'
+			regressions.append(name)
+		elif ratio < 1 / (1 + tolerance):
+			flag = ' improvement'
+		print('{:<70} {:>12.4g} {:>12.4g} {:>8.2f}   {}{}'.format(name, result['value'], reference['value'], ratio, result['unit'], flag))
+	return regressions
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(prog = 'python -m ExperimentManager.benchmarks', description = 'Benchmarks of the hot paths of ExperimentManager.')
+	parser.add_argument('--only', nargs = '+', choices = CASES, default = CASES, help = 'cases to run (default: all)')
+	parser.add_argument('--repeat', type = int, default = 5, help = 'the best of repeat measures is kept (default: 5)')
+	parser.add_argument('--output', help = 'write the results to this json file')
+	parser.add_argument('--baseline', default = DEFAULT_BASELINE, help = 'baseline json file (default: baseline.json of the benchmarks package)')
+	parser.add_argument('--save-baseline', action = 'store_true', help = 'write the results as the new baseline instead of comparing')
+	parser.add_argument('--tolerance', type = float, default = 0.25, help = 'relative slowdown reported as a regression (default: 0.25)')
+	parser.add_argument('--check', action = 'store_true', help = 'exit with status 1 if there are regressions')
+	args = parser.parse_args(argv)
+
+	output = { 'environment' : environment(), 'results' : run_cases(args.only, args.repeat) }
+
+	if args.output is not None:
+		with open(args.output, 'w') as file:
+			json.dump(output, file, indent = 4)
+
+	if args.save_baseline:
+		baseline = {}
+		if os.path.isfile(args.baseline):
+			with open(args.baseline, 'r') as file:
+				baseline = json.load(file)['results']
+		baseline.update(output['results'])
+		with open(args.baseline, 'w') as file:
+			json.dump({ 'environment' : output['environment'], 'results' : baseline }, file, indent = 4)
+		print('Baseline written to {}'.format(args.baseline))
+		return 0
+
+	baseline = {}
+	if os.path.isfile(args.baseline):
+		with open(args.baseline, 'r') as file:
+			baseline = json.load(file)['results']
+	else:
+		print('No baseline found at {}, use --save-baseline to record one'.format(args.baseline))
+
+	regressions = compare(output['results'], baseline, args.tolerance)
+	if len(regressions) > 0:
+		print('{} regression(s) above {:.0%} : {}'.format(len(regressions), args.tolerance, ', '.join(regressions)))
+		if args.check:
+			return 1
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,45 @@
+''' Benchmark of ExperimentManager.get_call_id (finding the current run) at various stack depths inside a run.
+
+Run with : python -m ExperimentManager.benchmarks.call_id
+'''
+import timeit
+
+from ExperimentManager.experiment import ExperimentManager
+
+# Unit of the results of run
+UNIT = 'us/call'
+
+
+def _at_depth(depth, call):
+	if depth > 0:
+		return _at_depth(depth - 1, call)
+	return call()
+
+
+def run(repeat = 5, depths = (0, 10, 50, 200)):
+	''' Return the best time per get_call_id call (in microseconds), depths are the number of frames between the command and the call.
+	'''
+	manager = ExperimentManager('call_id benchmark', ghost = True, verbose = 0)
+
+	def command():
+		results = {}
+		for depth in depths:
+			timer = timeit.Timer(lambda : _at_depth(depth, manager.get_call_id))
+			number, _ = timer.autorange()
+			results['get_call_id (depth {})'.format(depth)] = 1e6 * min(timer.repeat(number = number, repeat = repeat)) / number
+		return results
+
+	manager.add_command(command)
+	results = manager.run('command')
+
+	timer = timeit.Timer(manager.get_call_id)
+	number, _ = timer.autorange()
+	results['get_call_id (outside of runs)'] = 1e6 * min(timer.repeat(number = number, repeat = repeat)) / number
+
+	manager.close()
+	return results
+
+
+if __name__ == "__main__":
+	for name, value in run().items():
+		print('{:<45} {:>10.2f} us/call'.format(name, value))
@@ -0,0 +1,48 @@
+''' Microbenchmark of the overhead added by config injection on a function call.
+
+Compares a plain call, a direct Signature.construct_arguments call and a call to a function captured by a ghost ExperimentManager.
+Run with : python -m ExperimentManager.benchmarks.capture_overhead
+'''
+import timeit
+
+from ExperimentManager.experiment import ExperimentManager
+from ExperimentManager.signature import Signature
+
+# Unit of the results of run
+UNIT = 'us/call'
+
+
+def function(a, b, c = 0, d = 1):
+	return a
+
+
+def run(repeat = 5):
+	''' Return the best time per call (in microseconds) for each benchmarked call.
+	'''
+
+	manager = ExperimentManager('capture benchmark', ghost = True, verbose = 0)
+	manager.add_config({ 'b' : 2, 'c' : 3 })
+	captured = manager.capture(function)
+
+	sig = Signature(function)
+	options = { 'b' : 2, 'c' : 3 }
+
+	calls = {
+		'plain call' : lambda : function(1, 2, c = 3),
+		'construct_arguments' : lambda : sig.construct_arguments((1,), {}, options),
+		'captured call' : lambda : captured(1),
+	}
+
+	results = {}
+	for name, call in calls.items():
+		timer = timeit.Timer(call)
+		number, _ = timer.autorange()
+		results[name] = 1e6 * min(timer.repeat(number = number, repeat = repeat)) / number
+
+	return results
+
+
+if __name__ == "__main__":
+	results = run()
+	for name, value in results.items():
+		print('{:<25} {:>10.3f} us/call ({:.1f}x plain call)'.format(name, value, value / results['plain call']))
@@ -0,0 +1,52 @@
+''' Benchmark of utils.get_options on large configurations, like model-zoo configs with thousands of keys and deep nesting.
+
+Run with : python -m ExperimentManager.benchmarks.get_options
+'''
+import copy
+import timeit
+
+from ExperimentManager.utils import get_options, PrefixTrie
+
+# Unit of the results of run
+UNIT = 'ms/call'
+
+
+def wide_config(n_groups = 50, n_keys = 100):
+	''' n_groups sub-dictionnaries of n_keys scalar values each.
+	'''
+	return { 'group {}'.format(i) : { 'key {}'.format(j) : float(j) for j in range(n_keys) } for i in range(n_groups) }
+
+def deep_config(depth = 8, branching = 3):
+	''' A complete tree of dictionnaries, with branching**depth scalar leaves.
+	'''
+	if depth == 0:
+		return 1.0
+	return { str(i) : deep_config(depth - 1, branching) for i in range(branching) }
+
+def _best(call, repeat):
+	timer = timeit.Timer(call)
+	number, _ = timer.autorange()
+	return 1e3 * min(timer.repeat(number = number, repeat = repeat)) / number
+
+
+def run(repeat = 5):
+	''' Return the best time per call (in milliseconds) of get_options for each benchmarked configuration.
+	'''
+	results = {}
+
+	for name, config, run_config, prefixes in [
+		('wide (5000 keys)', wide_config(), { 'group 3' : { 'key 1' : 0. } }, ['group 3', 'group 10.key 5', 'group 20.']),
+		('deep (6561 leaves)', deep_config(), { '0' : { '1' : { '2' : 0. } } }, ['0.1', '1.1.1.1.1.1', '2.']),
+	]:
+		trie = PrefixTrie(prefixes)
+		results['{} deepcopy reference'.format(name)] = _best(lambda : copy.deepcopy(config), repeat)
+		results['{} full merge'.format(name)] = _best(lambda : get_options(config, run_config), repeat)
+		results['{} prefixes'.format(name)] = _best(lambda : get_options(config, run_config, prefixes), repeat)
+		results['{} compiled prefixes'.format(name)] = _best(lambda : get_options(config, run_config, trie), repeat)
+
+	return results
+
+
+if __name__ == "__main__":
+	for name, value in run().items():
+		print('{:<45} {:>10.4f} ms/call'.format(name, value))
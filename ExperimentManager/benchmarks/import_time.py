@@ -0,0 +1,34 @@
+''' Benchmark of the cold import time of ExperimentManager, measured in fresh interpreters.
+
+Run with : python -m ExperimentManager.benchmarks.import_time
+'''
+import os
+import subprocess
+import sys
+
+# Unit of the results of run
+UNIT = 'ms'
+
+SCRIPT = 'import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)'
+
+
+def _import_time(module):
+	env = dict(os.environ)
+	# Importing the package from the current source tree
+	root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+	env['PYTHONPATH'] = os.pathsep.join([root] + ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+	output = subprocess.check_output([sys.executable, '-c', SCRIPT.format(module)], env = env)
+	return 1e3 * float(output.decode().strip().splitlines()[-1])
+
+
+def run(repeat = 5):
+	''' Return the best import time (in milliseconds) over repeat fresh interpreters.
+	'''
+	return {
+		'import ExperimentManager' : min( _import_time('ExperimentManager') for _ in range(repeat) ),
+	}
+
+
+if __name__ == "__main__":
+	for name, value in run().items():
+		print('{:<45} {:>10.2f} ms'.format(name, value))
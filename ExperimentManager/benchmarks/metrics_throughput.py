@@ -0,0 +1,52 @@
+''' Benchmark of the time per call of log_scalar and log_scalars, inside and outside of runs, for both metrics formats.
+
+Run with : python -m ExperimentManager.benchmarks.metrics_throughput
+'''
+import tempfile
+import time
+
+from ExperimentManager.experiment import ExperimentManager
+
+# Unit of the results of run
+UNIT = 'us/call'
+
+
+def _per_call(function, n):
+	start = time.perf_counter()
+	for i in range(n):
+		function(i)
+	return 1e6 * (time.perf_counter() - start) / n
+
+
+def _benchmark(experiments_dir, metrics_format, n, repeat):
+	manager = ExperimentManager('metrics benchmark', experiments_dir = experiments_dir, verbose = 0, metrics_format = metrics_format, save_sources = False)
+	values = [ float(i) for i in range(10) ]
+	header = [ 'value {}'.format(i) for i in range(10) ]
+
+	results = {}
+	results['log_scalar ({}, run_id given)'.format(metrics_format)] = min( _per_call(lambda i : manager.log_scalar('scalar', i, run_id = -1), n) for _ in range(repeat) )
+	results['log_scalars 10 values ({}, run_id given)'.format(metrics_format)] = min( _per_call(lambda i : manager.log_scalars('scalars', values, header = header, run_id = -1), n) for _ in range(repeat) )
+
+	# Inside a run, the run is found by inspecting the stack
+	def command():
+		return min( _per_call(lambda i : manager.log_scalar('scalar', i), n // 10) for _ in range(repeat) )
+	manager.add_command(command)
+	results['log_scalar ({}, in a run)'.format(metrics_format)] = manager.run('command')
+
+	manager.close()
+	return results
+
+
+def run(repeat = 5, n = 2000):
+	''' Return the best time per call (in microseconds) over repeat series of n calls.
+	'''
+	results = {}
+	with tempfile.TemporaryDirectory() as experiments_dir:
+		for metrics_format in ['csv', 'stream']:
+			results.update(_benchmark(experiments_dir, metrics_format, n, repeat))
+	return results
+
+
+if __name__ == "__main__":
+	for name, value in run().items():
+		print('{:<45} {:>10.2f} us/call'.format(name, value))
@@ -0,0 +1,52 @@
+''' Benchmark of the latency of manager.save for each default saver (numpy, json, string and matplotlib).
+
+Run with : python -m ExperimentManager.benchmarks.saving
+'''
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from ExperimentManager.experiment import ExperimentManager
+
+# Unit of the results of run
+UNIT = 'ms/save'
+
+
+def _per_save(manager, obj, name, n):
+	start = time.perf_counter()
+	for i in range(n):
+		manager.save(obj, name)
+	return 1e3 * (time.perf_counter() - start) / n
+
+
+def run(repeat = 5, n = 20):
+	''' Return the best time per save (in milliseconds) over repeat series of n saves, every save creates a new version of the file.
+	'''
+	figure = plt.figure()
+	plt.plot(np.arange(100), np.random.rand(100))
+
+	objects = {
+		'numpy (1000x100 array)' : np.random.rand(1000, 100),
+		'json (100 keys)' : { 'key {}'.format(i) : i for i in range(100) },
+		'string (10 kB)' : 'a' * 10000,
+		'matplotlib (line plot)' : figure,
+	}
+
+	results = {}
+	with tempfile.TemporaryDirectory() as experiments_dir:
+		manager = ExperimentManager('saving benchmark', experiments_dir = experiments_dir, verbose = 0, save_sources = False)
+		for index, (name, obj) in enumerate(objects.items()):
+			results[name] = min( _per_save(manager, obj, 'object {}'.format(index), n) for _ in range(repeat) )
+		manager.close()
+
+	plt.close(figure)
+	return results
+
+
+if __name__ == "__main__":
+	for name, value in run().items():
+		print('{:<45} {:>10.3f} ms/save'.format(name, value))
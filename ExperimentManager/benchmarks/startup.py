@@ -0,0 +1,44 @@
+''' Benchmark of the creation (and closing) of an experiment with getManager, with and without saving a snapshot of the project sources.
+
+The project is a temporary directory holding n_files small python files.
+Run with : python -m ExperimentManager.benchmarks.startup
+'''
+import os
+import tempfile
+import time
+
+from ExperimentManager import getManager
+
+# Unit of the results of run
+UNIT = 'ms'
+
+
+def make_project(project_dir, n_files = 200, n_dirs = 10):
+	for i in range(n_dirs):
+		os.makedirs(os.path.join(project_dir, 'package_{}'.format(i)), exist_ok = True)
+	for i in range(n_files):
+		with open(os.path.join(project_dir, 'package_{}'.format(i % n_dirs), 'module_{}.py'.format(i)), 'w') as file:
+			file.write('def function_{}(a, b = 1):\n    return a + b\n'.format(i) * 20)
+
+
+def _startup(project_dir, experiments_dir, save_sources):
+	start = time.perf_counter()
+	manager = getManager('startup benchmark', experiments_dir = experiments_dir, project_dir = project_dir, verbose = 1, save_sources = save_sources)
+	manager.close()
+	return 1e3 * (time.perf_counter() - start)
+
+
+def run(repeat = 5):
+	''' Return the best time (in milliseconds) to create and close an experiment.
+	'''
+	results = {}
+	with tempfile.TemporaryDirectory() as project_dir, tempfile.TemporaryDirectory() as experiments_dir:
+		make_project(project_dir)
+		results['getManager + close'] = min( _startup(project_dir, experiments_dir, False) for _ in range(repeat) )
+		results['getManager + close, 200 sources'] = min( _startup(project_dir, experiments_dir, True) for _ in range(repeat) )
+	return results
+
+
+if __name__ == "__main__":
+	for name, value in run().items():
+		print('{:<45} {:>10.2f} ms'.format(name, value))
@@ -0,0 +1,53 @@
+''' Benchmark of the std capture (StreamToLogger) on regular prints, on progress bars redrawn with carriage returns and on progress bars redrawn on new lines with a flush after every redraw (keras with verbose=2, tqdm in a non-tty).
+
+Run with : python -m ExperimentManager.benchmarks.stdout_capture
+'''
+import io
+import logging
+import time
+
+from ExperimentManager.stdout_capturing import StreamToLogger
+
+# Unit of the results of run
+UNIT = 'us/write'
+
+
+def _writes(kind, n):
+	if kind == 'lines':
+		return [ 'Epoch {} - loss : {:.4f}\n'.format(i, 1. / (i + 1)) for i in range(n) ]
+	if kind == 'tqdm':
+		return [ '\r{:3d}%|{:<20}| {}/{}'.format(100 * i // n, '#' * (20 * i // n), i, n) for i in range(n) ] + ['\n']
+	if kind == 'keras':
+		return [ '\r{}/{} [{:<30}] - loss: {:.4f}'.format(i, n, '=' * (30 * i // n) + '>', 1. / (i + 1)) for i in range(n) ] + ['\n']
+	if kind == 'keras flushed':
+		return [ '{}/{} [{:<30}] - loss: {:.4f}\n'.format(i, n, '=' * (30 * i // n) + '>', 1. / (i + 1)) for i in range(n) ]
+	raise Exception('Unknown kind of writes {}'.format(kind))
+
+
+def _per_write(writes, flush = False):
+	logger = logging.getLogger('stdout capture benchmark')
+	logger.propagate = False
+	logger.handlers = [logging.StreamHandler(io.StringIO())]
+	stream = StreamToLogger(logger, io.StringIO())
+	start = time.perf_counter()
+	for buf in writes:
+		stream.write(buf)
+		if flush:
+			stream.flush()
+	stream.flush_logs()
+	return 1e6 * (time.perf_counter() - start) / len(writes)
+
+
+def run(repeat = 5, n = 10000):
+	''' Return the best time per write (in microseconds) over repeat series of n writes.
+	'''
+	results = {}
+	for kind in ['lines', 'tqdm', 'keras', 'keras flushed']:
+		writes = _writes(kind, n)
+		results['{} writes'.format(kind)] = min( _per_write(writes, flush = kind.endswith('flushed')) for _ in range(repeat) )
+	return results
+
+
+if __name__ == "__main__":
+	for name, value in run().items():
+		print('{:<45} {:>10.3f} us/write'.format(name, value))
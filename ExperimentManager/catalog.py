@@ -0,0 +1,264 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+'''
+SQLite catalog of all the experiments and runs of an experiments directory.
+
+Every ExperimentManager writes its experiment, runs (with their flattened configs), saved files and metrics summaries to catalog.sqlite in its experiments_dir.
+Writes are buffered and executed in batched transactions. Use Catalog.query_runs (or ExperimentManager.query_runs) to search the runs.
+The default rollback journal works on any filesystem. WAL mode lets readers and the writer work concurrently but is unsafe on network filesystems (NFS...), it is only enabled on request.
+'''
+
+CATALOG_NAME = 'catalog.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS experiments (
+	experiment TEXT PRIMARY KEY,
+	name TEXT,
+	created REAL,
+	closed REAL,
+	status TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+	experiment TEXT,
+	run_id INTEGER,
+	name TEXT,
+	command TEXT,
+	run_dir TEXT,
+	created REAL,
+	started REAL,
+	finished REAL,
+	duration REAL,
+	calls INTEGER,
+	status TEXT,
+	PRIMARY KEY (experiment, run_id)
+);
+CREATE INDEX IF NOT EXISTS runs_command ON runs (command, created);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created);
+CREATE TABLE IF NOT EXISTS configs (
+	experiment TEXT,
+	run_id INTEGER,
+	key TEXT,
+	value,
+	PRIMARY KEY (experiment, run_id, key)
+);
+CREATE INDEX IF NOT EXISTS configs_key_value ON configs (key, value);
+CREATE TABLE IF NOT EXISTS artifacts (
+	experiment TEXT,
+	run_id INTEGER,
+	name TEXT,
+	path TEXT,
+	created REAL
+);
+CREATE INDEX IF NOT EXISTS artifacts_run ON artifacts (experiment, run_id);
+CREATE TABLE IF NOT EXISTS metrics (
+	experiment TEXT,
+	run_id INTEGER,
+	metric TEXT,
+	value_name TEXT,
+	count INTEGER,
+	last_step,
+	last REAL,
+	min REAL,
+	min_step,
+	max REAL,
+	max_step,
+	mean REAL,
+	std REAL,
+	PRIMARY KEY (experiment, run_id, metric, value_name)
+);
+'''
+
+RUN_COLUMNS = ['experiment','run_id','name','command','run_dir','created','started','finished','duration','calls','status']
+
+
+def flatten(config, prefix = ''):
+	''' Flatten nested dictionnaries into {'a.b.c' : value}. Values that SQLite can not store (lists, objects...) are converted to json (or str).
+	'''
+	flat = {}
+	for key, value in config.items():
+		path = '{}{}'.format(prefix, key)
+		if isinstance(value, dict):
+			flat.update(flatten(value, path + '.'))
+		else:
+			flat[path] = sql_value(value)
+	return flat
+
+def sql_value(value):
+	if value is None or isinstance(value, (int, float, str)):
+		return value
+	try:
+		return json.dumps(value)
+	except (TypeError, ValueError):
+		return str(value)
+
+def to_timestamp(date):
+	''' Accept datetimes or timestamps (seconds since the epoch).
+	'''
+	if isinstance(date, datetime):
+		return date.timestamp()
+	return date
+
+
+class Catalog():
+	''' Buffered writer and reader of a catalog.sqlite file. Supports concurrency (several threads, and several processes thanks to SQLite's locking).
+
+	# Args
+		- path : the catalog file
+		- batch_size (default 100) : number of buffered statements that triggers a write, flush writes them at once
+		- wal (default False) : use SQLite's WAL journal mode, only on local filesystems
+		- logger (optionnal) : where to log a failure to enable WAL mode, printed otherwise
+	'''
+
+	def __init__(self, path, batch_size = 100, wal = False, logger = None):
+
+		self.path = path
+		self.batch_size = batch_size
+
+		self.pending = [] # (sql, parameters) executed in the next transaction
+		self.lock = threading.Lock()
+
+		self.connection = sqlite3.connect(path, timeout = 30, check_same_thread = False)
+		if wal:
+			try:
+				mode = self.connection.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+			except sqlite3.OperationalError as err:
+				mode = str(err)
+			if mode != 'wal':
+				message = 'Could not enable WAL mode for the catalog {} ({}), using the default journal mode'.format(path, mode)
+				if logger is not None:
+					logger.warning(message)
+				else:
+					print(message)
+		self.connection.executescript(SCHEMA)
+		self.connection.commit()
+
+	def execute(self, sql, parameters = ()):
+		''' Buffer a statement.
+		'''
+		try:
+			self.lock.acquire()
+			self.pending.append((sql, parameters))
+			full = len(self.pending) >= self.batch_size
+		finally:
+			self.lock.release()
+		if full:
+			self.flush()
+
+	def flush(self):
+		''' Execute the buffered statements in a single transaction.
+		'''
+		try:
+			self.lock.acquire()
+			if len(self.pending) == 0 or self.connection is None:
+				return
+			pending, self.pending = self.pending, []
+			with self.connection:
+				for sql, parameters in pending:
+					self.connection.execute(sql, parameters)
+		finally:
+			self.lock.release()
+
+	def close(self):
+		self.flush()
+		try:
+			self.lock.acquire()
+			if self.connection is not None:
+				self.connection.close()
+				self.connection = None
+		finally:
+			self.lock.release()
+
+	'''
+	Writing
+	'''
+
+	def add_experiment(self, experiment, name, created = None):
+		self.execute('INSERT OR REPLACE INTO experiments VALUES (?,?,?,?,?)', (experiment, name, created if created is not None else time.time(), None, 'Running'))
+
+	def reopen_experiment(self, experiment):
+		self.execute('UPDATE experiments SET closed = NULL, status = ? WHERE experiment = ?', ('Running', experiment))
+
+	def close_experiment(self, experiment, status = 'Closed'):
+		self.execute('UPDATE experiments SET closed = ?, status = ? WHERE experiment = ?', (time.time(), status, experiment))
+
+	def add_run(self, experiment, run_id, name, command, run_dir, created = None):
+		self.execute('INSERT OR REPLACE INTO runs (experiment, run_id, name, command, run_dir, created, calls, status) VALUES (?,?,?,?,?,?,?,?)',
+			(experiment, run_id, name, command, run_dir, created if created is not None else time.time(), 0, 'Created'))
+
+	def update_run(self, experiment, run_id, status, started = None, finished = None, duration = None, calls = None):
+		self.execute('UPDATE runs SET status = ?, started = coalesce(started, ?), finished = coalesce(?, finished), duration = coalesce(?, duration), calls = coalesce(?, calls) WHERE experiment = ? AND run_id = ?',
+			(status, started, finished, duration, calls, experiment, run_id))
+
+	def set_config(self, experiment, run_id, config):
+		''' Replace the config of a run (run_id -1 for the global config) by the flattened config.
+		'''
+		self.execute('DELETE FROM configs WHERE experiment = ? AND run_id = ?', (experiment, run_id))
+		for key, value in flatten(config).items():
+			self.execute('INSERT INTO configs VALUES (?,?,?,?)', (experiment, run_id, key, value))
+
+	def add_artifact(self, experiment, run_id, name, path):
+		self.execute('INSERT INTO artifacts VALUES (?,?,?,?,?)', (experiment, run_id, name, path, time.time()))
+
+	def set_metrics(self, experiment, run_id, summaries):
+		''' Replace the metrics summaries of a run, summaries are {metric : MetricStatistics.summary()}.
+		'''
+		for metric, summary in summaries.items():
+			for value_name, stats in summary['values'].items():
+				self.execute('INSERT OR REPLACE INTO metrics VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)',
+					(experiment, run_id, metric, value_name, summary['count'], sql_value(summary['last_step']), stats['last'], stats['min'], sql_value(stats['min_step']), stats['max'], sql_value(stats['max_step']), stats['mean'], stats['std']))
+
+	'''
+	Reading
+	'''
+
+	def query_runs(self, command = None, name = None, status = None, experiment_name = None, since = None, until = None, config = None, include_config = False, limit = None):
+		''' Search the runs of the catalog, all the criteria are optionnal and combined.
+
+		# Args
+			- command : the name of the command of the runs
+			- name : a pattern of the name of the runs (SQL LIKE, use % as a wildcard)
+			- status : 'Created', 'Running', 'Finished', 'Pruned' or 'Failed'
+			- experiment_name : a pattern of the name of the experiments (SQL LIKE)
+			- since, until : datetimes or timestamps bounding the creation time of the runs
+			- config : a dictionnary of config values the runs must have. Nested keys are joined by dots ({'optimizer.lr' : 1e-3}) or given as nested dictionnaries.
+			- include_config : add the flattened config of every run to the results
+			- limit : maximum number of runs, most recent first
+
+		# Returns
+			- a list of dictionnaries (one per run) with the columns of the runs table and the experiment's name
+		'''
+		self.flush()
+
+		conditions, parameters = [], []
+		for column, value in [('r.command = ?', command), ('r.name LIKE ?', name), ('r.status = ?', status), ('e.name LIKE ?', experiment_name), ('r.created >= ?', to_timestamp(since)), ('r.created <= ?', to_timestamp(until))]:
+			if value is not None:
+				conditions.append(column)
+				parameters.append(value)
+		for key, value in flatten(config if config is not None else {}).items():
+			conditions.append('EXISTS (SELECT 1 FROM configs c WHERE c.experiment = r.experiment AND c.run_id = r.run_id AND c.key = ? AND c.value = ?)')
+			parameters += [key, value]
+
+		sql = 'SELECT {}, e.name FROM runs r LEFT JOIN experiments e ON e.experiment = r.experiment'.format(', '.join( 'r.{}'.format(column) for column in RUN_COLUMNS ))
+		if len(conditions) > 0:
+			sql += ' WHERE ' + ' AND '.join(conditions)
+		sql += ' ORDER BY r.created DESC'
+		if limit is not None:
+			sql += ' LIMIT {}'.format(int(limit))
+
+		try:
+			self.lock.acquire()
+			rows = self.connection.execute(sql, parameters).fetchall()
+			runs = []
+			for row in rows:
+				run = dict(zip(RUN_COLUMNS, row))
+				run['experiment_name'] = row[-1]
+				if include_config:
+					run['config'] = dict(self.connection.execute('SELECT key, value FROM configs WHERE experiment = ? AND run_id = ?', (run['experiment'], run['run_id'])).fetchall())
+				runs.append(run)
+			return runs
+		finally:
+			self.lock.release()
@@ -0,0 +1,144 @@
+import copy
+import threading
+
+'''
+Versioned configuration store. Configurations are immutable : updating a run's configuration creates a new root dictionnary that shares all untouched sub-dictionnaries with the previous version.
+'''
+
+
+class FrozenDict(dict):
+	''' An immutable dictionnary. 
+	
+	Copies (copy.copy and copy.deepcopy) are regular, mutable, dictionnaries so that options handed out to captured functions can still be modified.
+	'''
+
+	def _immutable(self, *args, **kwargs):
+		raise TypeError('Configurations are immutable, use ExperimentManager.add_config to update them')
+
+	__setitem__ = _immutable
+	__delitem__ = _immutable
+	__ior__ = _immutable
+	clear = _immutable
+	pop = _immutable
+	popitem = _immutable
+	setdefault = _immutable
+	update = _immutable
+
+	def __copy__(self):
+		return dict(self)
+
+	def __deepcopy__(self, memo):
+		return { copy.deepcopy(key, memo) : copy.deepcopy(value, memo) for key, value in self.items() }
+
+	def __reduce__(self):
+		return (FrozenDict, (dict(self),))
+
+
+def make_immutable(value):
+	''' Recursively convert the dictionnaries of value to FrozenDicts. Other containers (lists...) are kept as is.
+	'''
+	if isinstance(value, FrozenDict) or not isinstance(value, dict):
+		return value
+	return FrozenDict({ key : make_immutable(sub_value) for key, sub_value in value.items() })
+
+
+class ConfigStore():
+	''' Holds an immutable configuration dictionnary and a version number for each run (the global configuration has run_id -1).
+
+	Can be used like a dictionnary of configurations indexed by run_id. Supports concurrency.
+	'''
+
+	def __init__(self):
+		self.configs = {}
+		self.versions = {}
+		self.lock = threading.Lock()
+
+	def __getitem__(self, run_id):
+		return self.configs[run_id]
+
+	def __setitem__(self, run_id, config):
+		try:
+			self.lock.acquire()
+			self.configs[run_id] = make_immutable(dict(config))
+			self.versions[run_id] = self.versions.get(run_id, -1) + 1
+		finally:
+			self.lock.release()
+
+	def __contains__(self, run_id):
+		return run_id in self.configs
+
+	def __iter__(self):
+		return iter(self.configs)
+
+	def __len__(self):
+		return len(self.configs)
+
+	def __repr__(self):
+		return repr(self.configs)
+
+	def update(self, run_id, config):
+		''' Update (shallowly, like dict.update) the configuration of a run. Returns the previous and the new version of the configuration.
+		
+		Only the root dictionnary is copied, untouched keys are shared with the previous version.
+		'''
+		try:
+			self.lock.acquire()
+			previous = self.configs[run_id]
+			current = dict(previous)
+			current.update({ key : make_immutable(value) for key, value in config.items() })
+			current = FrozenDict(current)
+			self.configs[run_id] = current
+			self.versions[run_id] += 1
+		finally:
+			self.lock.release()
+		return previous, current
+
+	def version(self, run_id):
+		return self.versions[run_id]
+
+	def snapshot(self):
+		''' Get a dictionnary of the current configurations, keys are run_ids.
+		'''
+		return dict(self.configs)
+
+
+_missing = object()
+
+def config_diff(previous, current, prefix = None):
+	''' List the differences between two configurations as (key path, previous value, current value) tuples. 
+	
+	Missing values are None-valued. Shared sub-dictionnaries are skipped without being traversed.
+	'''
+	diff = []
+	for key in current:
+		path = key if prefix is None else '{}.{}'.format(prefix, key)
+		previous_value = previous.get(key, _missing)
+		current_value = current[key]
+		if previous_value is current_value:
+			continue
+		if isinstance(previous_value, dict) and isinstance(current_value, dict):
+			diff += config_diff(previous_value, current_value, path)
+		elif previous_value is _missing:
+			diff.append((path, None, current_value))
+		elif _changed(previous_value, current_value):
+			diff.append((path, previous_value, current_value))
+	for key in previous:
+		if key not in current:
+			diff.append((key if prefix is None else '{}.{}'.format(prefix, key), previous[key], None))
+	return diff
+
+
+def _changed(previous, current):
+	try:
+		return bool(previous != current)
+	except Exception:
+		# numpy arrays and the likes do not have a truth value
+		return True
+
+
+def format_diff(diff):
+	''' Get a printable version of a config_diff.
+	'''
+	if len(diff) == 0:
+		return 'no changes'
+	return '\n'.join('{} : {} -> {}'.format(path, previous, current) for path, previous, current in diff)
@@ -10,6 +10,7 @@ import functools
 import traceback
 import subprocess
 import re
+import threading
 
 FileWriter = None
 try:
@@ -35,15 +36,31 @@ except:
 
 
 
-from ExperimentManager.utils import timestamp, setup_logger, pprint_dict, get_options, datestamp, print_clean_stack
+from ExperimentManager.utils import timestamp, setup_logger, release_logger, pprint_dict, get_options, PrefixTrie, datestamp, print_clean_stack, allocate_dir, shareable, stack_frames
 from ExperimentManager.run import Run
-from ExperimentManager.signature import Signature
+from ExperimentManager.signature import Signature, rebind_defaults
 from ExperimentManager.stdout_capturing import StreamToLogger
 from ExperimentManager.saving import Saver, VersionsHandler
 from ExperimentManager.metrics import MetricsManager
+from ExperimentManager.pruning import RunPruned
+from ExperimentManager.tracing import tracer
+from ExperimentManager.profiling import RunProfiler, aggregate_profiles
+from ExperimentManager.sampling import StackSampler
+from ExperimentManager.memory import MemoryMonitor
+from ExperimentManager.resources import ResourceSampler
+from ExperimentManager.catalog import Catalog, CATALOG_NAME
+from ExperimentManager.ledger import LEDGER_NAME
+from ExperimentManager.state import StateJournal, LazyDict, load_state, unserializable, STATE_NAME
+import ExperimentManager.overhead as overhead
+from ExperimentManager.logging_queue import LogWriter
+from ExperimentManager.file_pool import file_pool
+from ExperimentManager.configs import ConfigStore, config_diff, format_diff
 from ExperimentManager.global_manager import global_manager
 from ExperimentManager.gpu_setup import keras_setup,cuda_setup
 
+# Methods replaced by no-ops on ghost managers (see ExperimentManager.install_ghost)
+GHOST_NOOPS = ['info','debug','debug_locals','log_scalar','log_scalars','log_histogram','read_metric','metric_summary','metric_tail','save','add_saver','add_source','save_project_sources','aggregate_profiles','release_run_files']
+
 class ExperimentManager(object):
 
 	def __init__(self,name,experiments_dir = None, project_dir = None, load_dir = None, verbose = 1, tensorboard = False, **kwargs):
@@ -56,6 +73,24 @@ class ExperimentManager(object):
 			- load_dir : directory used for easier imports, it will be prefixed on all paths generated using manager.get_load_path
 			- verbose : 0,1 or 2. 1 will add some internal logs in experiment_info.log while 2 will log details on every internal function call in debug.log  (only use this to test the behavior of this class, it slows the process down by a lot!)
 			- tensorboard : True or False, log to tensorboard events when using metric logging methods
+			- async_logging (default True) : write all log files (experiment, runs, std capture and metrics) from a single background thread instead of the caller's thread
+			- max_open_files (optionnal) : maximum number of log files kept open at once by all experiments (see file_pool.FilePool), defaults to a quarter of the system limit
+			- metrics_format (default 'csv') : 'csv' to log each metric to its own csv file, 'stream' to log all the metrics of a run to a single indexed file (see metrics.MetricsStream)
+			- metrics_buffer_size (default 1024) : number of recent values of each metric kept in memory (see metric_tail)
+			- multiprocess (default False) : support logging metrics from forked child processes (multiprocessing pools, data loader workers...). Each process writes its own shard of the metrics, auto-incremented steps are shared by all the processes and the shards are merged by step on close
+			- trace (default False) : record the runs, saves, metrics writes, captured calls and Profiler sections of all threads and write them to trace.json (Chrome trace events, see tracing.Tracer) on close
+			- profile (default False) : profile every run with cProfile (see run)
+			- sample (default False) : sample the stacks of every run (see run)
+			- sampling_interval (default 0.01) : seconds between two samples of the stacks of a run
+			- memory (default False) : monitor the memory usage of every run (see run)
+			- memory_top (default 10) : number of allocation sites logged by the memory monitor
+			- memory_threshold (optionnal) : peak RSS (in MB) above which the memory monitor dumps a tracemalloc snapshot
+			- resources (default False) : log the CPU, memory, threads, I/O and open files of the process to the 'resources' metrics of the running runs (see resources.ResourceSampler)
+			- resources_interval (default 1.) : seconds between two readings of the resources
+			- save_sources (default True) : save a copy of the project sources (see save_project_sources) in the experiment directory
+			- versioning (default 'memory') : how saved files are versioned (see save). 'memory' keeps track of the versions in this process only, 'file' reserves them on disk so that processes (even on different machines) saving to the same directory never overwrite each other's files
+			- catalog (default False) : record the experiment, its runs (status, times, config), saved files and metrics summaries in the SQLite catalog of experiments_dir (see query_runs and catalog.Catalog)
+			- catalog_wal (default False) : use SQLite's WAL mode for the catalog (concurrent reads while runs are written), only if experiments_dir is on a local filesystem
 		
 		'''
 		super().__init__()
@@ -68,6 +103,11 @@ class ExperimentManager(object):
 		
 		# Setting the experiment mode. Ghost => nothing will be written (no directories, saves etc.).
 		self.ghost = False if not 'ghost' in kwargs else kwargs['ghost']		
+		if self.ghost:
+			self.install_ghost()
+		
+		# State of the experiment that is being resumed, see resume
+		resume_state = None if not 'resume_state' in kwargs else kwargs['resume_state']
 		
 		# Trying to find the directory containig the source code, if not provided
 		if project_dir is None:
@@ -81,8 +121,8 @@ class ExperimentManager(object):
 			experiments_dir = os.path.join(self.project_dir,experiments_dir)
 		self.experiments_dir = experiments_dir
 		
-		if not os.path.isdir(self.experiments_dir) and not self.ghost:
-			os.makedirs(self.experiments_dir)
+		if not self.ghost:
+			os.makedirs(self.experiments_dir, exist_ok = True)
 
 		if load_dir is not None:
 			if not os.path.isabs(load_dir):
@@ -90,17 +130,12 @@ class ExperimentManager(object):
 		self.load_dir = load_dir
 
 		
-		# Creating this specific experiment's directory using the experiment name and home-cooked versionning. This is not a very safe/stable method.
+		# Creating this specific experiment's directory using the experiment name and timestamp. Experiments started in the same minute get a unique suffix, even from different processes.
 		if not self.ghost: 
-			experiment_name = '{} {}'.format(self.name,timestamp())
-			experiment_dir = os.path.join(experiments_dir,experiment_name)
-			index = 0
-			while os.path.isdir(experiment_dir):
-				index += 1
-				experiment_dir = os.path.join(experiments_dir,'{} ({})'.format(experiment_name,index))
-			os.mkdir(experiment_dir)
-			self.experiment_dir = experiment_dir
-			self.experiment_name = '{} ({})'.format(experiment_name,index)
+			if resume_state is None:
+				self.experiment_dir, self.experiment_name = allocate_dir(experiments_dir, '{} {}'.format(self.name,timestamp()))
+			else:
+				self.experiment_dir, self.experiment_name = resume_state['experiment']['experiment_dir'], resume_state['experiment']['experiment_name']
 			
 			# Creating subdirectories for saved files and saved metrics
 			self.runs_dir = os.path.join(self.experiment_dir,'runs')
@@ -121,57 +156,114 @@ class ExperimentManager(object):
 			self.sources_dir = None
 		
 		
-		# Setting up loggers
+		# Setting up loggers, files are written by a background LogWriter unless async_logging is False
+		async_logging = True if not 'async_logging' in kwargs else kwargs['async_logging']
+		if 'max_open_files' in kwargs:
+			file_pool.max_open = kwargs['max_open_files']
+		self.log_writer = LogWriter() if async_logging and not self.ghost else None
+		
+		# Optional tracing of the experiment activity
+		self.trace = False if not 'trace' in kwargs else kwargs['trace']
+		if self.trace:
+			tracer.start()
+		
 		logger_path = os.path.join(self.experiment_dir,'experiment_info.log') if not self.ghost else None
-		self.logger = setup_logger('experiment',logger_path)
+		self.logger = setup_logger('experiment',logger_path, writer = self.log_writer)
 
 		if self.verbose > 1:
 			debug_logger_path = os.path.join(self.experiment_dir,'debug.log') if not self.ghost else None
-			self.debugger = setup_logger('minisacred_debug',debug_logger_path, level = logging.DEBUG)
+			self.debugger = setup_logger('minisacred_debug',debug_logger_path, level = logging.DEBUG, writer = self.log_writer)
 		
 		## Redirecting stdout and stderr to an unformatted logger
 		if not self.ghost:
 			std_logger_path = os.path.join(self.experiment_dir,'std_capture.log') if not self.ghost else None
-			self.std_logger = setup_logger('std',std_logger_path,format = False)
+			self.std_logger = setup_logger('std',std_logger_path,format = False, writer = self.log_writer)
 
 			self.stdout_orig = sys.stdout
-			stdout_capture = StreamToLogger(self.std_logger,self.stdout_orig,logging.INFO)
-			sys.stdout = stdout_capture
+			self.stdout_capture = StreamToLogger(self.std_logger,self.stdout_orig,logging.INFO)
+			sys.stdout = self.stdout_capture
 			
 			self.stderr_orig = sys.stderr
-			stderr_capture = StreamToLogger(self.std_logger,self.stderr_orig,logging.ERROR)
-			sys.stderr = stderr_capture
+			self.stderr_capture = StreamToLogger(self.std_logger,self.stderr_orig,logging.ERROR)
+			sys.stderr = self.stderr_capture
 
 
 		# Initializing empty variables
 			
-		self.saving_versions = VersionsHandler() # a VesionHandler to keep track of saved files. Supports concurrency.
+		# Resumed experiments version their files on disk, so that the files saved by the previous process are never overwritten
+		self.versioning = 'memory' if not 'versioning' in kwargs else kwargs['versioning']
+		if resume_state is not None:
+			self.versioning = 'file'
+		self.saver = Saver(versioning = self.versioning, info = self.info, warn = self.warn, debug_locals = self.debug_locals) # Creating handler for saving files during experiment
+		self.saving_versions = self.saver.verions_handler # a VesionHandler to keep track of saved files. Supports concurrency.
 		self.saving_history = {}
 	
 		self.runs_versions = VersionsHandler() # a VesionHandler to keep track of run_ids. Supports concurrency.
 		self.runs_versions.add('global')
-			
-		self.saver = Saver(self.saving_versions, info = self.info, warn = self.warn, debug_locals = self.debug_locals) # Creating handler for saving files during experiment
 		
 		self.runs = { -1 : self } # will contain the run instance, keys are run_ids. 
 		
 		self.wrapped_functions = [] # will hold the list of functions in which experiment parameters are injected
 		
+		self.captured_signatures = {} # signature and prefixes of each captured function, keys are the original functions
+		
+		self.static_functions = [] # will hold the list of functions captured with static=True
+		self.static_keys = set() # config keys resolved by the static functions, None if they resolved every key (see add_config)
+		
+		self.options_caches = [] # options cached by each captured function, keys are run ids (see resolve_options)
+		
+		self.frozen = False # once frozen (see freeze), captured functions use the static versions in self.frozen_functions
+		self.frozen_functions = {}
+		
 		self.commands = {} # will hold the list of functions that can be called with experiment_manager_instance.run, keys are command names
 		
 		self.tensorboard = tensorboard # boolean
 
-		self.config = { -1 : {} } # will contain Configuration dictionnaries for each run as well as one that is global (-1)
+		self.config = ConfigStore() # will contain immutable, versioned, configuration dictionnaries for each run as well as one that is global (-1)
+		self.config[-1] = {}
 
 		self.task_queue = []
 
+		self.pruners = [] # see add_pruner
+
+		self.profile = False if not 'profile' in kwargs else kwargs['profile']
+		self.sample = False if not 'sample' in kwargs else kwargs['sample']
+		self.sampling_interval = 0.01 if not 'sampling_interval' in kwargs else kwargs['sampling_interval']
+		self.memory = False if not 'memory' in kwargs else kwargs['memory']
+		self.memory_top = 10 if not 'memory_top' in kwargs else kwargs['memory_top']
+		self.memory_threshold = None if not 'memory_threshold' in kwargs else kwargs['memory_threshold']
+		
+		# Background sampling of the resources used during runs
+		resources = False if not 'resources' in kwargs else kwargs['resources']
+		resources_interval = 1. if not 'resources_interval' in kwargs else kwargs['resources_interval']
+		self.resource_sampler = ResourceSampler(interval = resources_interval) if resources and not self.ghost else None
+
+		# Catalog of all the experiments and runs of experiments_dir
+		catalog = False if not 'catalog' in kwargs else kwargs['catalog']
+		catalog_wal = False if not 'catalog_wal' in kwargs else kwargs['catalog_wal']
+		self.catalog = Catalog(os.path.join(self.experiments_dir, CATALOG_NAME), wal = catalog_wal, logger = self.logger) if catalog and not self.ghost else None
+		if self.catalog is not None and resume_state is None:
+			self.catalog.add_experiment(self.experiment_dir, self.experiment_name)
+		elif self.catalog is not None:
+			self.catalog.reopen_experiment(self.experiment_dir)
+
 		self._get_call_id_depths = []
+		self.active_calls = 0 # number of runs being called, get_call_id does not look through the stack if there are none
+		self.calls_lock = threading.Lock()
 
 
 		# Verifying necessary librairies are present
 		assert (not self.tensorboard) or (self.tensorboard and FileWriter is not None), 'Can not use tensorboard feature without having either Tensorflow or Torch installed.'
 
 		# Setting up metrics support
+		self.metrics_format = 'csv' if not 'metrics_format' in kwargs else kwargs['metrics_format']
+		if self.metrics_format not in ['csv','stream']:
+			raise Exception("Unknown metrics_format '{}', should be 'csv' or 'stream'".format(self.metrics_format))
+		self.metrics_buffer_size = 1024 if not 'metrics_buffer_size' in kwargs else kwargs['metrics_buffer_size']
+		self.multiprocess = False if not 'multiprocess' in kwargs else kwargs['multiprocess']
+		if self.multiprocess and self.metrics_format != 'csv':
+			raise Exception("The multiprocess option requires metrics_format 'csv'")
+		
 		if not self.ghost:
 
 			if self.tensorboard:
@@ -183,7 +275,7 @@ class ExperimentManager(object):
 				self.tb_base_dir,self.tb_dir = None,None
 				tb_writer = None
 			
-			self.metrics = { -1 : MetricsManager(-1, self.metrics_dir, tb_writer = tb_writer) } # will contain MetricsLoggers for each run as well as one that is global (-1) 
+			self.metrics = { -1 : MetricsManager(-1, self.metrics_dir, tb_writer = tb_writer, log_writer = self.log_writer, multiplexed = self.metrics_format == 'stream', buffer_size = self.metrics_buffer_size, multiprocess = self.multiprocess) } # will contain MetricsLoggers for each run as well as one that is global (-1) 
 		
 		else:
 			self.metrics = None
@@ -203,13 +295,26 @@ class ExperimentManager(object):
 		if is_keras:
 			keras_setup(self.gpu_options['allow_growth'],self.gpu_options["memory_fraction_per_gpu"])
 		
-		# Saving the project sources
-		if not self.ghost:
+		# Journal of the state of the experiment, used to resume it
+		self.journal = StateJournal(os.path.join(self.experiment_dir,STATE_NAME)) if not self.ghost else None
+		self.resumed_runs = set() # ids of the runs of a resumed experiment that were not used yet, see restore_run
+		self.resume_lock = threading.Lock()
+		if resume_state is not None:
+			self.restore(resume_state)
+		elif self.journal is not None:
+			options = { 'load_dir' : self.load_dir, 'verbose' : self.verbose, 'tensorboard' : self.tensorboard, 'metrics_format' : self.metrics_format, 'metrics_buffer_size' : self.metrics_buffer_size, 'multiprocess' : self.multiprocess }
+			self.journal.append('experiment', name = self.name, experiments_dir = self.experiments_dir, project_dir = self.project_dir, experiment_name = self.experiment_name, experiment_dir = self.experiment_dir, options = options)
+		
+		# Saving the project sources (they were already saved for resumed experiments)
+		save_sources = True if not 'save_sources' in kwargs else kwargs['save_sources']
+		if not self.ghost and save_sources and resume_state is None:
 			self.save_project_sources(**{  key:kwargs[key] for key in ['skip_dirs','include_extensions','include_names'] if key in kwargs })
 	
 		
 		# logging the end of the setup
 		self.info('Finished setting up Experiment! Configuration is {}'.format(pprint_dict(self.get_config(),output='return',name='')))
+		if self.catalog is not None:
+			self.catalog.flush()
 		
 	
 	'''
@@ -235,10 +340,23 @@ class ExperimentManager(object):
 			cout = pprint_dict(locals_dict,limit=limit,output='return', name = '')
 			self.debug('{} - arguments on call \n{}'.format(stack[1][3],cout))
 	
+	def install_ghost(self):
+		''' Replace the logging, saving and metrics methods of this manager by no-ops (see GHOST_NOOPS), so that calling them in ghost mode costs nothing : not even the arguments are inspected.
+		'''
+		noop = lambda *args, **kwargs : None
+		for name in GHOST_NOOPS:
+			setattr(self, name, noop)
+		self.add_monitors = lambda *args, **kwargs : []
+	
 	def add_header(self,message, level = 0):
+		# Measured inline : a wrapper would shift the stack inspected below
+		start = time.perf_counter_ns() if overhead.ENABLED else None
 		caller_run = self.get_call_id()
 		caller_function = inspect.stack()[2][3]
-		return '- run {} - {} -{} {}'.format(caller_run,caller_function, '-'*2*level, message)
+		header = '- run {} - {} -{} {}'.format(caller_run,caller_function, '-'*2*level, message)
+		if start is not None:
+			overhead.add('ExperimentManager.add_header', start)
+		return header
 	
 	
 	'''
@@ -251,19 +369,39 @@ class ExperimentManager(object):
 		
 		if run_id is None:
 			run_id = self.get_call_id()
-		if self.verbose  > 0: 
-			config_orig = deepcopy(self.config)
-		self.config[run_id].update(config)
-		if self.verbose > 0:
-			self.info("Updated config for run_id {} \n{} \n{}".format(run_id,pprint_dict(config_orig,output = 'return', name = 'Before'),pprint_dict(self.config,output = 'return', name = 'After')))
+		
+		self.check_config_update(config, run_id == -1)
+		previous, current = self.config.update(run_id, config)
+		if self.catalog is not None:
+			self.catalog.set_config(self.experiment_dir, run_id, current if run_id == -1 else get_options(self.config[-1], current))
+		if self.journal is not None:
+			invalid = unserializable(config)
+			if len(invalid) > 0:
+				self.warn('Config values {} of run_id {} can not be stored as json, they will be converted (to strings or lists) if the experiment is resumed'.format(invalid, run_id))
+			self.journal.append('config', run_id = run_id, config = current)
+		# Ghost managers only store the config (captured functions still read it), diffing it would be wasted
+		if self.verbose > 0 and not self.ghost:
+			self.info("Updated config for run_id {} (version {}) \n{}".format(run_id,self.config.version(run_id),format_diff(config_diff(previous,current))))
 			
 			
-	def capture(self,wrapped=None, prefixes=None):
+	def check_config_update(self, config, is_global):
+		''' Raise an error if updating the global config (is_global) or a run config with config would go unnoticed by frozen or static functions.
+		'''
+		if self.frozen:
+			raise Exception('Tried to add a config after the configuration was frozen (manager.freeze()). Captured functions would not see the update : add all configs before freezing.')
+		
+		if len(self.static_functions) > 0 and (is_global or self.static_keys is None or any( key in self.static_keys for key in config )):
+			raise Exception('Tried to update the global config or keys {} resolved by static functions (capture(static=True)) after capturing them. They would not see the update : add these configs before capturing.'.format(sorted(self.static_keys) if self.static_keys is not None else 'all'))
+			
+	def capture(self,wrapped=None, prefixes=None, static=False):
 		''' Decorator to inject config parameters as default values in the a function.
 		
 		The injection will happen as follows :
 			- we look for the run_id and add it to the injected parameters if found as _run_id, we also inject the run as _run, the run_path as _experiment_dir and the run_logger as _logger. We load the run-specific parameters.
 			- if no run_id is foud, it means that the captured function was called outside of a ex.run. We will only inject the shared parameters.
+		
+		If static is True, the config is resolved once, when decorating, and the function is returned with the config injected as its default values : calling it costs exactly as much as a normal call.
+		Updating the global config or the keys the function resolved afterwards will raise an error, other keys of the run configs can still be updated. See also ExperimentManager.freeze.
 			
 		'''
 		
@@ -271,35 +409,105 @@ class ExperimentManager(object):
 		
 		if wrapped is None:
 			return functools.partial(self.capture,
-					prefixes=prefixes)		
+					prefixes=prefixes, static=static)		
 		
 		if wrapped in self.wrapped_functions:
 			return wrapped
 			# Nothing needs to be done
 				
-		# Capturing the signature
+		# Capturing the signature and compiling the prefixes
 		sig = Signature(wrapped)
+		selector = PrefixTrie(prefixes) if prefixes is not None else None
+		
+		if static:
+			static_function = self.make_static(wrapped, sig, selector)
+			self.static_functions.append(static_function)
+			# Top level keys of the config the function depends on (all of them if it takes every option through **kwargs)
+			if prefixes is None and sig.kw_wildcard_name is not None:
+				self.static_keys = None
+			elif self.static_keys is not None:
+				self.static_keys.update(sig.arguments if prefixes is None else [ prefix.split('.')[0] for prefix in prefixes ])
+			self.info('Captured function {} with prefixes {} as a static function'.format(wrapped.__name__,prefixes))
+			return static_function
 		
 		# Defining the wrapped function
+		original = wrapped
+		cache = {} # options of the last call for every run_id, see resolve_options
+		self.options_caches.append(cache)
+		
 		@wrapt.decorator
 		def wrapped_function(wrapped, instance, args, kwargs):
+			if self.frozen:
+				static_function = self.frozen_functions[original]
+				return static_function(*args, **kwargs) if instance is None else static_function(instance, *args, **kwargs)
+			start = time.perf_counter_ns() if tracer.enabled else None
 			run_id = self.get_call_id()
 			bound = (instance is not None)
-			options = get_options(self.config[-1], run_dict = None if run_id is -1 else self.config[run_id], prefixes = prefixes)
+			options = self.resolve_options(cache, run_id, selector)
 			args, kwargs = sig.construct_arguments(args, kwargs, options,bound)
 			result = wrapped(*args, **kwargs)
+			if start is not None:
+				tracer.add(original.__name__, 'capture', start, time.perf_counter_ns(), {'run_id' : run_id})
 			return result
 		
 		# Recoverng the original name
 		wrapped_function.__name__ = wrapped.__name__
 		
 		# Adding to the list of captured functions
-		self.wrapped_functions.append(wrapped_function(wrapped,**{}))
+		function = wrapped_function(wrapped,**{})
+		self.wrapped_functions.append(function)
+		self.captured_signatures[original] = (sig, selector)
+		if self.frozen:
+			self.frozen_functions[original] = self.make_static(original, sig, selector)
 		
 		# Logging the result
 		self.info('Captured function {} with prefixes {}'.format(wrapped.__name__,prefixes))
 		
-		return wrapped_function(wrapped,**{})
+		return function
+	
+	def resolve_options(self, cache, run_id, selector):
+		''' Get the options of a captured function for run_id. They are kept in cache and reused as long as the configs keep the same versions, unless they hold mutable values (every call then gets its own copy).
+		'''
+		versions = (self.config.version(-1), None if run_id == -1 else self.config.version(run_id))
+		cached = cache.get(run_id)
+		if cached is not None and cached[0] == versions:
+			return cached[1]
+		options = get_options(self.config[-1], run_dict = None if run_id == -1 else self.config[run_id], prefixes = selector)
+		if shareable(options):
+			cache[run_id] = (versions, options)
+		return options
+	
+	def release_options(self, run_id):
+		''' Drop the options cached for run_id by the captured functions, called at the end of every run so that the caches do not grow with the number of runs.
+		'''
+		for cache in self.options_caches:
+			cache.pop(run_id, None)
+	
+	def make_static(self, function, sig, prefixes, run_id = None):
+		''' Resolve the options of a captured function once and return a static version of that function (see signature.rebind_defaults).
+		
+		Prefixes can be a list or a compiled PrefixTrie.
+		'''
+		if run_id is None:
+			run_id = self.get_call_id()
+		options = get_options(self.config[-1], run_dict = None if run_id == -1 else self.config[run_id], prefixes = prefixes)
+		return rebind_defaults(function, sig, options)
+	
+	def freeze(self, run_id = None):
+		''' Freeze the configuration for all captured functions and commands. Meant for production processes in which the config never changes after startup.
+		
+		The options of every captured function are resolved once (using the config of run_id, which defaults to the current run) and calls then skip the run id lookup, the options merging and the arguments binding.
+		Adding a config after freezing will raise an error.
+		'''
+		self.debug_locals()
+		
+		if run_id is None:
+			run_id = self.get_call_id()
+		
+		self.frozen_functions = { function : self.make_static(function, sig, prefixes, run_id) for function, (sig, prefixes) in self.captured_signatures.items() }
+		self.frozen = True
+		
+		self.info('Froze the configuration of run_id {} for {} captured functions'.format(run_id,len(self.frozen_functions)))
 		
 	'''
 	Runs
@@ -326,7 +534,7 @@ class ExperimentManager(object):
 		self.debug_locals()
 		
 		if wrapped is None:
-			return functools.partial(self.capture,
+			return functools.partial(self.command,
 					prefixes=prefixes)		
 		
 		# Checking that there is no other command by the same name. Better way to handle ? (maybe use an actual id instaed of function name)
@@ -337,14 +545,21 @@ class ExperimentManager(object):
 			return wrapped
 			# Nothing needs to be done
 				
-		# Capturing the signature
+		# Capturing the signature and compiling the prefixes
 		sig = Signature(wrapped)
+		selector = PrefixTrie(prefixes) if prefixes is not None else None
 		
 		# Defining the wrapped function
+		original = wrapped
+		cache = {} # options of the last call for every run_id, see resolve_options
+		self.options_caches.append(cache)
+		
 		@wrapt.decorator
 		def wrapped_function(wrapped, instance, args, kwargs):
+			if self.frozen:
+				return self.frozen_functions[original](*args, **kwargs)
 			run_id = self.get_call_id()
-			options = get_options(self.config[-1], run_dict = None if run_id is -1 else self.config[run_id], prefixes = prefixes)
+			options = self.resolve_options(cache, run_id, selector)
 			args, kwargs = sig.construct_arguments(args, kwargs, options,False)
 			result = wrapped(*args, **kwargs)
 			return result
@@ -353,15 +568,19 @@ class ExperimentManager(object):
 		wrapped_function.__name__ = wrapped.__name__
 		
 		# Adding to the list of captured functions
-		self.wrapped_functions.append(wrapped_function(wrapped,**{}))
+		function = wrapped_function(wrapped,**{})
+		self.wrapped_functions.append(function)
+		self.captured_signatures[original] = (sig, selector)
+		if self.frozen:
+			self.frozen_functions[original] = self.make_static(original, sig, selector)
 		
 		# Adding to the list of commands
-		self.commands.update({wrapped_function.__name__ : wrapped_function(wrapped,**{})})
+		self.commands.update({wrapped_function.__name__ : function})
 		
 		# Logging the result
 		self.info('Captured function {} with prefixes {}'.format(wrapped.__name__,prefixes))
 		
-		return wrapped_function(wrapped,**{})
+		return function
 		
 		
 	def add_command(self,function):
@@ -391,64 +610,157 @@ class ExperimentManager(object):
 		# Checking if the command exists
 		if not command_name in self.commands:
 			raise Exception('Command name {} is not recorded'.format(command_name))
+		
+		# Rejecting the update before anything is created for the run
+		if update_dict is not None:
+			self.check_config_update(update_dict, False)
 	
 
 		# Creating name and id for the run in a safe way.
-		run_name = run_name if run_name is not None else command_name
-		run_name, run_id = self.runs_versions.add('{}'.format(run_name), return_id = True)
+		base_name = run_name if run_name is not None else command_name
+		run_name, run_id = self.runs_versions.add('{}'.format(base_name), return_id = True)
 		
-		# Creating the associated directories and paths
+		# Creating the associated directories
 		if not self.ghost :
 		
-			run_dir = os.path.join(self.runs_dir,run_name)
+			# the run's name gets a unique suffix if its directory already exists (created by another process for instance)
+			run_dir, run_name = allocate_dir(self.runs_dir,run_name)
+			os.makedirs(os.path.join(run_dir,'files'))
+			os.makedirs(os.path.join(run_dir,'metrics'))
+			
+		else:
+			run_dir = None
+		
+		# Creating the Run instance, with its loggers and metrics
+		run = self.create_run(run_id, run_name, self.commands[command_name], run_dir)
+		if self.journal is not None:
+			self.journal.append('run', id = run_id, name = run_name, base = base_name, command = command_name)
+		
+		# Adding a config entry
+		self.config[run_id] = {}
+		if update_dict is not None:
+			self.add_config(update_dict,run_id) # need to specify the run_id because, at this point, the run_id has not yet been declared in the run method
+		
+		self.runs[run_id] = run
+		
+		if self.catalog is not None:
+			self.catalog.add_run(self.experiment_dir, run_id, run_name, command_name, run_dir)
+			self.catalog.set_config(self.experiment_dir, run_id, get_options(self.config[-1], self.config[run_id]))
+		
+		# Logging the result
+		self.info('Finished creating run, {}'.format(pprint_dict(run.__dict__,output='return',name='__dict__')))
+		
+		return run
+	
+	def create_run(self, run_id, run_name, command, run_dir, command_name = None):
+		''' Create the Run instance of a run directory (None in ghost mode), along with its loggers and metrics. 
+		
+		The command can be None if its name is given, it is then resolved when the run is called (see restore_run).
+		'''
+		if run_dir is not None:
 			run_logger_path = os.path.join(run_dir,'run.log')
 			run_info_logger_path = os.path.join(run_dir,'run_info.log')
+			run_ledger_path = os.path.join(run_dir,LEDGER_NAME)
 			run_save_dir = os.path.join(run_dir,'files')
 			run_metrics_dir = os.path.join(run_dir,'metrics')
 			run_tb_dir = os.path.join(self.tb_base_dir,run_name) if self.tensorboard else None
-			
-			# will raise error if already exists
-			os.makedirs(run_dir) 
-			os.makedirs(run_save_dir)
-			os.makedirs(run_metrics_dir)
-			
 		else:
-			run_dir = None
 			run_logger_path = None
 			run_info_logger_path = None			
+			run_ledger_path = None
 			run_save_dir = None
 			run_metrics_dir = None
 			run_tb_dir = None
 			
 		# Defining the loggers
-		logger = setup_logger(run_name,run_logger_path)
-		info_logger = setup_logger(run_name+'_info',run_info_logger_path, format=False)
+		logger = setup_logger(run_name,run_logger_path, writer = self.log_writer)
+		info_logger = setup_logger(run_name+'_info',run_info_logger_path, format=False, writer = self.log_writer)
+		ledger = setup_logger(run_name+'_ledger',run_ledger_path, format=False, writer = self.log_writer) if not self.ghost else None
 		
 		# Defining metrics and tensorboard writers
 		if not self.ghost:
 			tb_writer = FileWriter(run_tb_dir) if self.tensorboard else None
-			self.metrics[run_id] = MetricsManager(run_id,run_metrics_dir,tb_writer=tb_writer)
+			self.metrics[run_id] = MetricsManager(run_id,run_metrics_dir,tb_writer=tb_writer, log_writer = self.log_writer, multiplexed = self.metrics_format == 'stream', buffer_size = self.metrics_buffer_size, multiprocess = self.multiprocess)
 		
-		# Adding a config entry
-		self.config[run_id] = {}
-		if update_dict is not None:
-			self.add_config(update_dict,run_id) # need to specify the run_id because, at this point, the run_id has not yet been declared in the run method
+		return Run(run_id,run_name,command,logger,info_logger, run_dir,run_save_dir,run_metrics_dir, run_tb_dir, ledger = ledger, command_name = command_name)
+	
+	@classmethod
+	def resume(cls, experiment_dir, **kwargs):
+		''' Reattach to an existing experiment (after a preemption for instance) instead of creating a new one.
 		
-		# Getting the actual command function
-		command = self.commands[command_name]
+		The state journal of the experiment (state.jsonl) is replayed : the runs (names, status and number of calls), configs and auto-incremented steps of the metrics are restored. Log and metrics files are appended to, without writing their headers again, and the project sources are not saved again. 
+		Run instances are only created when they are first used and their commands are resolved when they are called (register the commands as usual after resuming) : resuming takes milliseconds whatever the number of runs.
+		Saved files are versioned on disk (versioning 'file'), so that the files saved before resuming are never overwritten. Metrics statistics only account for the values logged after resuming.
 		
-		# Creating the Run instance
-		run = Run(run_id,run_name,command,logger,info_logger, run_dir,run_save_dir,run_metrics_dir, run_tb_dir)
+		# Args
+			- experiment_dir : the directory of the experiment
+			- kwargs : options of the manager (see __init__). The name, project directory, load_dir, verbose, tensorboard and metrics options of the experiment are kept unless given.
 		
-		self.runs[run_id] = run
+		# Returns
+			- the ExperimentManager of the experiment
+		'''
+		experiment_dir = os.path.abspath(experiment_dir)
+		path = os.path.join(experiment_dir,STATE_NAME)
+		if not os.path.isfile(path):
+			raise Exception('No state journal ({}) was found in {}, it can not be resumed'.format(STATE_NAME,experiment_dir))
+		state = load_state(path)
+		if state['experiment'] is None:
+			raise Exception('The state journal {} has no experiment record (the experiment probably stopped while it was being created), it can not be resumed'.format(path))
+		
+		# The experiment directory may have been moved
+		experiment = state['experiment']
+		experiment.update(experiment_dir = experiment_dir, experiments_dir = os.path.dirname(experiment_dir), experiment_name = os.path.basename(experiment_dir))
+		
+		options = dict(experiment['options'])
+		options.update(kwargs)
+		name = options.pop('name', experiment['name'])
+		project_dir = options.pop('project_dir', experiment['project_dir'])
+		return cls(name, experiments_dir = experiment['experiments_dir'], project_dir = project_dir, resume_state = state, **options)
+	
+	def restore(self, state):
+		''' Restore the versions, global config and global metrics of a resumed experiment, its runs are restored on first access (see restore_run).
+		'''
+		self.resumed_state = state
+		for run in state['runs'].values():
+			self.runs_versions.versions[run['base']] = self.runs_versions.versions.get(run['base'], -1) + 1
+		if -1 in state['configs']:
+			self.config[-1] = state['configs'][-1]
+		if not self.ghost:
+			for name, (header, step) in state['metrics'].get(-1, {}).items():
+				self.metrics[-1].resume_metric(name, header, step)
 		
-		# Logging the result
-		self.info('Finished creating run, {}'.format(pprint_dict(run.__dict__,output='return',name='__dict__')))
+		self.resumed_runs.update(state['runs'])
+		self.runs = LazyDict(self.runs, self.resumed_runs, self.restore_run)
+		if not self.ghost:
+			self.metrics = LazyDict(self.metrics, self.resumed_runs, self.restore_run)
 		
-		return run
+		self.info('Resumed experiment {} with {} runs'.format(self.experiment_dir, len(state['runs'])))
+	
+	def restore_run(self, run_id):
+		''' Create the Run instance of a run of a resumed experiment, with its config, number of calls and metrics steps.
+		'''
+		try:
+			self.resume_lock.acquire()
+			if run_id not in self.resumed_runs:
+				return
+			record = self.resumed_state['runs'][run_id]
+			run = self.create_run(run_id, record['name'], self.commands.get(record['command']), os.path.join(self.runs_dir,record['name']), command_name = record['command'])
+			run.status = record['status']
+			for _ in range(record['calls']):
+				run.increment_calls()
+			self.config[run_id] = self.resumed_state['configs'].get(run_id, {})
+			if not self.ghost:
+				for name, (header, step) in self.resumed_state['metrics'].get(run_id, {}).items():
+					self.metrics[run_id].resume_metric(name, header, step)
+			self.runs[run_id] = run
+			self.resumed_runs.discard(run_id)
+		finally:
+			self.resume_lock.release()
 	
-	def run_existing(self, run_id,  update_dict = None, parallel = False, call_options = None):
+	def run_existing(self, run_id,  update_dict = None, parallel = False, call_options = None, profile = None, sample = None, memory = None):
 		''' Run an existing run instance using its ID. You could of course also directly call the run with you call_options, the advantage of using this method is that it will log the start and end of the run in the global log file.
+		
+		If profile is True (defaults to the manager's profile option), the call is profiled with cProfile. If sample is True (defaults to the manager's sample option), its stacks are sampled. If memory is True (defaults to the manager's memory option), its memory usage is recorded. See run.
 		'''
 		
 		self.debug_locals()
@@ -457,32 +769,74 @@ class ExperimentManager(object):
 			raise Exception('run_id {} was not found in the saved runs : {}'.format(run_id,self.runs))
 			
 		run = self.runs[run_id]
+		
+		# Commands of resumed runs are resolved on their first call
+		if run.command is None:
+			if not run.command_name in self.commands:
+				raise Exception('Command name {} of run {} is not recorded'.format(run.command_name,run_id))
+			run.command = self.commands[run.command_name]
 
 		# updating the list of depths at which an ID is defined
-		self._get_call_id_depths.append(len(inspect.stack())) # the run call is at stack()[-len(stack)]
-		self._get_call_id_depths.sort(reverse=True)
+		depth = len(stack_frames(sys._getframe())) # the run call is at stack_frames()[-depth]
+		try:
+			self.calls_lock.acquire()
+			if not depth in self._get_call_id_depths:
+				self._get_call_id_depths.append(depth)
+				self._get_call_id_depths.sort(reverse=True)
+		finally:
+			self.calls_lock.release()
 	
 		if call_options is None:
 			call_options = {}
 		
 		# Actually doing the run
-		self.info('Startig run for command {} with id {} and configration {}'.format(run.command.__name__, run.id,pprint_dict(self.config,output='return')))
-		
+		monitors = self.add_monitors(run, profile = profile, sample = sample, memory = memory)
+		if self.resource_sampler is not None:
+			self.resource_sampler.add_run(run.id, self.metrics[run.id])
+		started = time.time()
 		try:
+			try:
+				self.calls_lock.acquire()
+				self.active_calls += 1 # decremented in finally, get_call_id looks through the stack while it is positive
+			finally:
+				self.calls_lock.release()
+			if self.verbose > 0:
+				self.info('Startig run for command {} with id {} and configration (version {}) {}'.format(run.command.__name__, run.id, self.config.version(run.id), pprint_dict(self.config[run.id],output='return')))
+			self.catalog_start(run, started)
 			call_id = run(**call_options)
-			self.info('Finished run for command {} with id {} after {} seconds'.format(run.command.__name__, run.id, run.calls_info[call_id]["duration"]))
+			self.info('{} run for command {} with id {} after {} seconds'.format(run.status, run.command.__name__, run.id, run.calls_info[call_id]["duration"]))
 			return run.results[call_id]
 		except Exception as err:
 			print_clean_stack(err)
 			print('Error type {} : {}'.format(sys.exc_info()[0],sys.exc_info()[1]))
 			self.info('Run for command {} with id {} failed with error type {} : {}'.format(run.command.__name__, run.id,sys.exc_info()[0],sys.exc_info()[1]))
+		finally:
+			try:
+				self.calls_lock.acquire()
+				self.active_calls -= 1
+			finally:
+				self.calls_lock.release()
+			self.release_options(run_id)
+			for monitor in monitors:
+				run.monitors.remove(monitor)
+			if self.resource_sampler is not None:
+				self.resource_sampler.remove_run(run.id)
+			self.release_run_files(run_id)
+			self.catalog_run(run, started)
+			self.journal_run(run)
 		
 	
 	
-	def run(self, command_name, update_dict = None, run_name = None, parallel = False, call_options = None):
+	def run(self, command_name, update_dict = None, run_name = None, parallel = False, call_options = None, profile = None, sample = None, memory = None):
 		''' Run a capture command function in an encapsulated way. 
 		
 		This creates a run entry in the ExperimentManager with associated specific run parameters, experiment_dir, logs and run informations.		
+		
+		If profile is True (defaults to the manager's profile option), the run is profiled with cProfile : profile_<call_id>.pstats and a text summary sorted by cumulative time, profile_<call_id>.txt, are written to the run directory. See aggregate_profiles to merge the profiles of several runs.
+		
+		If sample is True (defaults to the manager's sample option), the stacks of the run are sampled every sampling_interval seconds by a watcher thread and written to stacks_<call_id>.folded in the run directory (collapsed stacks, for flamegraphs). Unlike profiling, sampling barely slows the run down.
+		
+		If memory is True (defaults to the manager's memory option), the RSS at the start and end of the run, its peak during the run and the top allocations that were not freed (tracemalloc) are written to run_info.log. They are also logged (in MB) to the 'memory' metrics of the run. If the peak RSS is above the memory_threshold option, the tracemalloc snapshot is dumped to memory_<call_id>.snapshot in the run directory.
 		'''
 		self.debug_locals()
 		
@@ -491,25 +845,166 @@ class ExperimentManager(object):
 		run_id = run.id
 
 		# updating the list of depths at which an ID is defined
-		self._get_call_id_depths.append(len(inspect.stack())) # the run call is at stack()[-len(stack)]
-		self._get_call_id_depths.sort(reverse=True)
+		depth = len(stack_frames(sys._getframe())) # the run call is at stack_frames()[-depth]
+		try:
+			self.calls_lock.acquire()
+			if not depth in self._get_call_id_depths:
+				self._get_call_id_depths.append(depth)
+				self._get_call_id_depths.sort(reverse=True)
+		finally:
+			self.calls_lock.release()
 		
 		if call_options is None:
 			call_options = {}
 		
 		# Actually doing the run
-		self.info('Startig run for command {} with id {} and configration {}'.format(command_name, run.id,pprint_dict(self.config,output='return')), level = 2)
+		monitors = self.add_monitors(run, profile = profile, sample = sample, memory = memory)
+		if self.resource_sampler is not None:
+			self.resource_sampler.add_run(run.id, self.metrics[run.id])
+		started = time.time()
 		try:
+			try:
+				self.calls_lock.acquire()
+				self.active_calls += 1 # decremented in finally, get_call_id looks through the stack while it is positive
+			finally:
+				self.calls_lock.release()
+			if self.verbose > 0:
+				self.info('Startig run for command {} with id {} and configration (version {}) {}'.format(command_name, run.id, self.config.version(run.id), pprint_dict(self.config[run.id],output='return')), level = 2)
+			self.catalog_start(run, started)
 			call_id = run(**call_options)
-			self.info('Finished run for command {} with id {} after {} seconds'.format(run.command.__name__, run.id, run.calls_info[call_id]["duration"]))
+			self.info('{} run for command {} with id {} after {} seconds'.format(run.status, run.command.__name__, run.id, run.calls_info[call_id]["duration"]))
 			return run.results[call_id]
 		except Exception as err:
 			print_clean_stack(err)
 			print('Error type {} : {}'.format(sys.exc_info()[0],sys.exc_info()[1]))
 			self.info('Run for command {} with id {} failed with error type {} : {}'.format(run.command.__name__, run.id,sys.exc_info()[0],sys.exc_info()[1]))
+		finally:
+			try:
+				self.calls_lock.acquire()
+				self.active_calls -= 1
+			finally:
+				self.calls_lock.release()
+			self.release_options(run_id)
+			for monitor in monitors:
+				run.monitors.remove(monitor)
+			if self.resource_sampler is not None:
+				self.resource_sampler.remove_run(run.id)
+			self.release_run_files(run_id)
+			self.catalog_run(run, started)
+			self.journal_run(run)
+		
+		
+		
+	def catalog_start(self, run, started):
+		''' Mark a run as running in the catalog.
+		'''
+		if self.catalog is None:
+			return
+		self.catalog.update_run(self.experiment_dir, run.id, 'Running', started = started)
+		self.catalog.flush()
+	
+	def catalog_run(self, run, started):
+		''' Record the end of a call of a run in the catalog : its status, times, number of calls, effective config and metrics summaries. The catalog is written at once.
+		'''
+		if self.catalog is None:
+			return
+		finished = time.time()
+		self.catalog.update_run(self.experiment_dir, run.id, run.status, started = started, finished = finished, duration = round(finished - started, 3), calls = len(run.calls_info))
+		self.catalog.set_config(self.experiment_dir, run.id, get_options(self.config[-1], self.config[run.id]))
+		self.catalog.set_metrics(self.experiment_dir, run.id, self.metrics[run.id].summaries())
+		self.catalog.flush()
+	
+	def journal_run(self, run):
+		''' Record the end of a call of a run in the state journal, with the steps of its metrics and of the global metrics.
+		'''
+		if self.journal is None:
+			return
+		self.journal.append('run_end', id = run.id, status = run.status, calls = len(run.calls_info))
+		self.journal.append('metrics', run_id = run.id, metrics = self.metrics[run.id].steps())
+		if len(self.metrics[-1].metrics) > 0:
+			self.journal.append('metrics', run_id = -1, metrics = self.metrics[-1].steps())
+	
+	@classmethod
+	def query_runs(cls, experiments_dir = None, **criteria):
+		''' Search the runs of all the experiments of an experiments directory, using its SQLite catalog.
+		
+		# Args
+			- experiments_dir : the experiments directory. If not provided, will use 'managed experiments' in the directory of the caller's file (the default of ExperimentManager). Relative paths are relative to that directory.
+			- criteria : command, name, status, experiment_name, since, until, config, include_config and limit, see catalog.Catalog.query_runs
+		
+		# Returns
+			- a list of dictionnaries (one per run, most recent first) with the experiment directory, run_id, name, command, run_dir, created, started, finished (timestamps), duration, calls, status and experiment_name of the runs
+		'''
+		project_dir = os.path.abspath(os.path.dirname(inspect.stack()[1].filename))
+		if experiments_dir is None:
+			experiments_dir = os.path.join(project_dir,'managed experiments')
+		elif not os.path.isabs(experiments_dir):
+			experiments_dir = os.path.join(project_dir,experiments_dir)
+		path = os.path.join(experiments_dir, CATALOG_NAME)
+		if not os.path.isfile(path):
+			raise Exception('No catalog was found in {}'.format(experiments_dir))
+		catalog = Catalog(path)
+		try:
+			return catalog.query_runs(**criteria)
+		finally:
+			catalog.close()
+	
+	def add_monitors(self, run, profile = None, sample = None, memory = None):
+		''' Add a RunProfiler, a StackSampler and a MemoryMonitor to the monitors of a run if profile, sample and memory (or, if None, the manager's options) are True. Nothing is added in ghost mode.
+		
+		# Returns
+			- the list of added monitors
+		'''
+		profile = self.profile if profile is None else profile
+		sample = self.sample if sample is None else sample
+		memory = self.memory if memory is None else memory
+		if self.ghost:
+			return []
+		monitors = []
+		if memory:
+			monitors.append(MemoryMonitor(metrics = self.metrics[run.id], top = self.memory_top, threshold = self.memory_threshold))
+		if sample:
+			monitors.append(StackSampler(interval = self.sampling_interval))
+		if profile:
+			monitors.append(RunProfiler(config = self.config[run.id]))
+		run.monitors += monitors
+		return monitors
+	
+	def aggregate_profiles(self, command_name):
+		''' Merge the profiles of all the runs of a command, into profiles/<command_name>.pstats and profiles/<command_name>.txt in the experiment directory.
+		
+		# Returns
+			- the merged pstats.Stats, None if no run of the command was profiled
+		'''
+		self.debug_locals()
 		
+		if self.ghost:
+			return None
 		
+		# (run_id, name, command name, run_dir) of every run, the runs of a resumed experiment that were not used yet are read from its state without restoring them
+		entries = [ (run_id, run.name, run.command_name, run.run_dir) for run_id, run in list(self.runs.items()) if run_id != -1 ]
+		entries += [ (run_id, record['name'], record['command'], os.path.join(self.runs_dir,record['name'])) for run_id, record in self.resumed_state['runs'].items() if run_id in self.resumed_runs ] if len(self.resumed_runs) > 0 else []
+		
+		paths = []
+		runs = []
+		for run_id, run_name, run_command, run_dir in sorted(entries):
+			if run_command != command_name or not os.path.isdir(run_dir):
+				continue
+			run_paths = sorted( os.path.join(run_dir,name) for name in os.listdir(run_dir) if name.startswith('profile_') and name.endswith('.pstats') )
+			if len(run_paths) > 0:
+				paths += run_paths
+				runs.append('{} (id {})'.format(run_name,run_id))
 		
+		if len(paths) == 0:
+			return None
+		
+		profiles_dir = os.path.join(self.experiment_dir,'profiles')
+		os.makedirs(profiles_dir,exist_ok=True)
+		header = 'Aggregated profile of command {} over {} calls of runs {}'.format(command_name,len(paths),', '.join(runs))
+		stats = aggregate_profiles(paths, output = os.path.join(profiles_dir,command_name), header = header)
+		self.info('Aggregated {} profiles of command {} in {}'.format(len(paths),command_name,profiles_dir))
+		return stats
+	
 	'''
 	Metrics
 	'''
@@ -544,6 +1039,8 @@ class ExperimentManager(object):
 		# Find the id of the desired metrics set
 		if run_id is None:
 			run_id = self.get_call_id()
+		
+		self.check_pruned(run_id)
 					
 		# Delegating to the right MetricsManager
 		step = self.metrics[run_id].log_scalars(file_name,values,step = step,header = header)
@@ -577,11 +1074,16 @@ class ExperimentManager(object):
 		# Find the id of the desired metrics set
 		if run_id is None:
 			run_id = self.get_call_id()
+		
+		self.check_pruned(run_id)
 					
 		# Delegating to the right MetricsManager
 		step = self.metrics[run_id].log_scalar(metric_name,value,step)
 		
 		self.debug('Metrics logged for metric {}'.format(metric_name))	
+		
+		if len(self.pruners) > 0 and run_id != -1:
+			self.report_pruners(run_id, metric_name, step, value)
 
 
 	
@@ -599,12 +1101,118 @@ class ExperimentManager(object):
 		# Find the id of the desired metrics set
 		if run_id is None:
 			run_id = self.get_call_id()
+		
+		self.check_pruned(run_id)
 					
 		# Delegating to the right MetricsManager
 		step = self.metrics[run_id].log_histogram(name,values,step)
 		
 		self.debug('Histogram logged with name {}'.format(name))
 
+	def read_metric(self, name, run_id = None):
+		''' Read back the values of a metric (or of a file of metrics logged with log_scalars).
+		
+		# Args
+			- name : the metric_name or file_name used when logging.
+			- run_id : the id of the run that logged the metric. It defaults to the current run.
+			
+		# Returns
+			- header : the list of value names
+			- rows : a list of (step, wall_time, values) tuples. The wall_time is only available with metrics_format 'stream', it is None otherwise.
+		'''
+		self.debug_locals()
+		
+		if self.ghost:
+			return None
+		
+		if run_id is None:
+			run_id = self.get_call_id()
+		
+		return self.metrics[run_id].read_metric(name)
+
+	def metric_summary(self, name, run_id = None):
+		''' Get the statistics of a metric (or of a file of metrics) without reading any file. They are updated at every log call.
+		
+		# Args
+			- name : the metric_name or file_name used when logging.
+			- run_id : the id of the run that logged the metric. It defaults to the current run.
+			
+		# Returns
+			- a dictionnary with the 'count' of log calls, the 'last_step' and in 'values', for each name of the header : the 'last', 'min', 'max', 'mean', 'variance' and 'std' of the values as well as the 'min_step' and 'max_step'.
+		'''
+		self.debug_locals()
+		
+		if self.ghost:
+			return None
+		
+		if run_id is None:
+			run_id = self.get_call_id()
+		
+		return self.metrics[run_id].summary(name)
+
+	def metric_tail(self, name, n = None, run_id = None):
+		''' Get the last values of a metric (or of a file of metrics) from memory. At most metrics_buffer_size values are kept.
+		
+		# Args
+			- name : the metric_name or file_name used when logging.
+			- n : the number of values, all the kept values if None.
+			- run_id : the id of the run that logged the metric. It defaults to the current run.
+			
+		# Returns
+			- steps : the list of steps, from oldest to newest
+			- values : a numpy array of shape (len(steps), number of values per log call)
+		'''
+		self.debug_locals()
+		
+		if self.ghost:
+			return None
+		
+		if run_id is None:
+			run_id = self.get_call_id()
+		
+		return self.metrics[run_id].tail(name, n)
+
+	'''
+	Pruning
+	'''
+
+	def add_pruner(self, pruner):
+		''' Stop unpromising runs early, based on the values they log for a metric (see pruning.MedianPruner and pruning.SuccessiveHalvingPruner).
+		
+		When the pruner decides to stop a run, the decision is written to the run's info log, should_stop returns True and the next log call of the run raises pruning.RunPruned, which ends the run with status 'Pruned'.
+		Only values logged with log_scalar are observed, runs are only compared to the other runs of the same command.
+		'''
+		self.debug_locals()
+		
+		self.pruners.append(pruner)
+		self.info('Added pruner {}'.format(pruner))
+
+	def should_stop(self, run_id = None):
+		''' True if the run was pruned. Use it to stop a run cleanly (saving a checkpoint for instance) before the next log call raises RunPruned.
+		
+		# Args
+			- run_id : the id of the run. It defaults to the current run.
+		'''
+		if run_id is None:
+			run_id = self.get_call_id()
+		
+		return run_id != -1 and self.runs[run_id].pruned is not None
+
+	def check_pruned(self, run_id):
+		if run_id != -1 and self.runs[run_id].pruned is not None:
+			raise RunPruned(run_id, self.runs[run_id].pruned)
+
+	def report_pruners(self, run_id, metric_name, step, value):
+		run = self.runs[run_id]
+		for pruner in self.pruners:
+			if pruner.metric != metric_name:
+				continue
+			reason = pruner.report(run.command.__name__, run_id, step, value)
+			if reason is not None and run.pruned is None:
+				run.pruned = reason
+				run.info_logger.info('({}) Pruned at step {} by {} : {}'.format(timestamp(), step, pruner, reason))
+				self.info('Run {} with id {} was pruned at step {} : {}'.format(run.name, run_id, step, reason))
+
 	'''
 	Saving
 	'''
@@ -718,6 +1326,9 @@ class ExperimentManager(object):
 		# Calling the Saver objcet
 		save_path = self.saver.save(obj,name,save_dir,method = method, method_args = method_args, overwrite = overwrite, method_kwargs = method_kwargs)
 
+		if self.catalog is not None:
+			self.catalog.add_artifact(self.experiment_dir, run_id, name, save_path)
+
 		# Saving to history
 		if not name in self.saving_history:
 			self.saving_history[name]  = []
@@ -779,6 +1390,20 @@ class ExperimentManager(object):
 	Cleaning
 	'''
 	
+	def release_run_files(self, run_id):
+		''' Close the log and metrics files of a run. They will be reopened (in append mode) if the run logs again.
+		
+		This is done automatically at the end of every run so that experiments with many runs and metrics stay within the limit of open files.
+		'''
+		if self.ghost:
+			return
+		
+		if run_id != -1:
+			release_logger(self.runs[run_id].logger)
+			release_logger(self.runs[run_id].info_logger)
+			release_logger(self.runs[run_id].ledger)
+		self.metrics[run_id].release_files()
+	
 	def close(self):
 		''' Meant to clean up the experiment. Std redirections will be reset and all unsaved metrics and logs will be written.
 		'''
@@ -788,9 +1413,50 @@ class ExperimentManager(object):
 		self.info('Closing off experiment. Std out and err are set back to original values. Unsaved metrics and logs will be saved.')
 		
 		if not self.ghost:
+			self.stdout_capture.flush_logs()
+			self.stderr_capture.flush_logs()
 			sys.stdout = self.stdout_orig
 			sys.stderr = self.stderr_orig
+		
+		if self.resource_sampler is not None:
+			self.resource_sampler.close()
+		
+		if overhead.ENABLED and not self.ghost:
+			self.logger.info(self.overhead_report())
+		
+		# Writing all queued logs and closing the files
+		if self.log_writer is not None:
+			self.log_writer.close()
+		elif not self.ghost:
+			for run_id in self.runs:
+				self.release_run_files(run_id)
+			for logger in [self.logger, self.std_logger] + ([self.debugger] if self.verbose > 1 else []):
+				release_logger(logger)
+		
+		# Metrics streams are written directly, not through the loggers
+		if not self.ghost:
+			for metrics in self.metrics.values():
+				metrics.close_shards()
+				metrics.save_summaries()
+				if metrics.stream is not None:
+					metrics.stream.release()
+		
+		if self.journal is not None:
+			for run_id, metrics in list(self.metrics.items()):
+				if len(metrics.metrics) > 0:
+					self.journal.append('metrics', run_id = run_id, metrics = metrics.steps())
+			self.journal.compact()
+		
+		if self.catalog is not None:
+			self.catalog.set_metrics(self.experiment_dir, -1, self.metrics[-1].summaries())
+			self.catalog.close_experiment(self.experiment_dir)
+			self.catalog.close()
 
+		if self.trace:
+			if not self.ghost:
+				tracer.save(os.path.join(self.experiment_dir,'trace.json'))
+			tracer.stop()
+		
 		global_manager.remove(self.name)
 		
 		
@@ -798,11 +1464,15 @@ class ExperimentManager(object):
 	Support functions
 	'''
 		
+	@overhead.instrument('ExperimentManager.get_call_id')
 	def get_call_id(self):
 		''' Look through the stack trace for to retrieve a local value in a specific function of a specific file.
 		'''	
 		
-		stack = inspect.stack()
+		if self.active_calls == 0:
+			return -1
+		
+		stack = stack_frames(sys._getframe())
 		length = len(stack)
 
 		target_filename = os.path.abspath(__file__)
@@ -814,14 +1484,19 @@ class ExperimentManager(object):
 			if i > length :
 				continue
 			frame = stack[-i]
-			function = frame.function
-			filename = os.path.abspath(frame.filename)
-			if filename == target_filename and function in ['run','run_existing'] and 'run_id' in frame.frame.f_locals:
-				run_id = frame.frame.f_locals['run_id']
+			function = frame.f_code.co_name
+			filename = os.path.abspath(frame.f_code.co_filename)
+			if filename == target_filename and function in ['run','run_existing'] and 'run_id' in frame.f_locals:
+				run_id = frame.f_locals['run_id']
 				break
 		
 		return run_id
 
+	def overhead_report(self):
+		''' A printable table of the number of calls and time spent in the manager's hot paths (see overhead.py), if the EXPERIMENT_MANAGER_OVERHEAD environment variable was set before importing ExperimentManager. It is also written to experiment_info.log on close.
+		'''
+		return overhead.report()
+
 	def current_run(self):
 		''' Return the current run.
 		'''		
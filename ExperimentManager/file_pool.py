@@ -0,0 +1,135 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+'''
+Pooling of the log files of all experiments.
+
+Every metric and every run has its own log files : long experiments can easily open more files than allowed by the system (ulimit -n).
+PooledFileHandlers share a FilePool that keeps at most max_open files open, closing the least recently used ones. Closed files are reopened in append mode on their next write.
+'''
+
+def default_max_open():
+	''' A quarter of the soft limit on open file descriptors (between 16 and 1024).
+	'''
+	try:
+		import resource
+		soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+	except:
+		return 256
+	if soft_limit == resource.RLIM_INFINITY:
+		return 1024
+	return min(1024, max(16, soft_limit // 4))
+
+
+class FilePool():
+	''' Keeps track of the open files of PooledFileHandlers and closes the least recently used ones when there are more than max_open. Supports concurrency.
+	'''
+
+	def __init__(self, max_open = None):
+		self.max_open = max_open if max_open is not None else default_max_open()
+		self.handlers = OrderedDict() # handlers having an open file, from least to most recently used
+		self.lock = threading.Lock()
+
+	def open(self, handler):
+		''' Open the file of a handler (the handler's lock should be held), possibly closing other files.
+		'''
+		stream = logging.FileHandler._open(handler)
+		try:
+			self.lock.acquire()
+			self.handlers[handler] = None
+			self.handlers.move_to_end(handler)
+			if len(self.handlers) > self.max_open:
+				self.evict(len(self.handlers) - self.max_open, handler)
+		finally:
+			self.lock.release()
+		return stream
+
+	def evict(self, n, keep):
+		''' Close the files of the n least recently used handlers. Handlers that are being written to are skipped.
+
+		The pool's lock should be held.
+		'''
+		for handler in list(self.handlers):
+			if n == 0:
+				break
+			if handler is keep or not handler.lock.acquire(blocking = False):
+				continue
+			try:
+				if handler.stream is not None:
+					handler.stream.close()
+					handler.stream = None
+			finally:
+				handler.lock.release()
+			del self.handlers[handler]
+			n -= 1
+
+	def touch(self, handler):
+		''' Mark a handler as the most recently used.
+		'''
+		try:
+			self.lock.acquire()
+			if handler in self.handlers:
+				self.handlers.move_to_end(handler)
+		finally:
+			self.lock.release()
+
+	def release(self, handler):
+		''' Close the file of a handler, it will be reopened if needed.
+		'''
+		try:
+			handler.acquire()
+			if handler.stream is not None:
+				handler.stream.close()
+				handler.stream = None
+		finally:
+			handler.release()
+		self.forget(handler)
+
+	def forget(self, handler):
+		try:
+			self.lock.acquire()
+			self.handlers.pop(handler, None)
+		finally:
+			self.lock.release()
+
+	def __len__(self):
+		return len(self.handlers)
+
+
+# The pool shared by all experiments
+file_pool = FilePool()
+
+# A lock held by another thread at fork time would never be released in the child
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child = lambda : setattr(file_pool, 'lock', threading.Lock()))
+
+
+class PooledFileHandler(logging.FileHandler):
+	''' A FileHandler (in append mode) whose file is opened through a FilePool.
+
+	The file is created right away but it is only opened when written to.
+	'''
+
+	def __init__(self, filename, pool = None, encoding = None):
+		self.pool = pool if pool is not None else file_pool
+		super().__init__(filename, mode = 'a', encoding = encoding, delay = True)
+		if not os.path.exists(self.baseFilename):
+			open(self.baseFilename, 'a').close()
+
+	def _open(self):
+		return self.pool.open(self)
+
+	def flush(self):
+		self.pool.touch(self)
+		super().flush()
+
+	def release_file(self):
+		''' Close the file until the next write.
+		'''
+		self.pool.release(self)
+
+	def close(self):
+		super().close()
+		self.pool.forget(self)
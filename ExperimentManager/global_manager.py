@@ -13,18 +13,18 @@ class GlobalManager():
             self.lock.acquire()
             self.experiments[experiment.name] = experiment
             self.callers[caller_filename] = experiment.name
-        except:
+        finally:
             self.lock.release()
 
     def remove(self,experiment_name):
         try:
             self.lock.acquire()
-            self.experiments.pop(experiment.name)
+            self.experiments.pop(experiment_name, None)
             for key in self.callers:
                 if self.callers[key] == experiment_name:
                     self.callers.pop(key)
                     break
-        except:
+        finally:
             self.lock.release()
 
 
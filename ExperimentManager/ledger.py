@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import time
+
+'''
+Run ledgers : an append-only file per run, run_info.jsonl, holding one compact json object per line for every event of the run.
+
+Every event has an 'event' name, a 'time' (seconds since the epoch), the 'run_id', the 'run' name and the 'call_id'. Calls of a run write :
+	- a 'start' event with 'args', a hash of the arguments of the call
+	- a 'stop' event with the 'status' ('Finished', 'Pruned' or 'Failed'), the 'duration' (in seconds) and the 'error' ('ErrorType: message', None if the call succeeded)
+
+Use LedgerReader to read or tail the ledgers of a run, an experiment or a whole experiments directory.
+'''
+
+LEDGER_NAME = 'run_info.jsonl'
+
+# Directories of experiments and runs that never contain ledgers
+SKIP_DIRS = ['files','metrics','tensorboard','sources','profiles']
+
+def format_event(event, **fields):
+	''' The line of an event in a ledger.
+	'''
+	return json.dumps(dict(event = event, time = round(time.time(), 6), **fields), separators = (',',':'), default = str)
+
+def args_hash(args, kwargs):
+	''' A short hash of the arguments of a call (of their repr), to tell apart calls with different arguments.
+	'''
+	text = repr(args) + repr(sorted(kwargs.items(), key = lambda item : item[0]))
+	return hashlib.blake2b(text.encode(), digest_size = 8).hexdigest()
+
+
+class LedgerReader():
+	''' Incremental reader of run ledgers. Every call to read returns the events written since the previous call : only the new lines of the ledgers are read, so tailing them stays cheap however long they are.
+
+	# Args
+		- path : a ledger file, or a directory (a run directory, an experiment directory or an experiments directory) whose ledgers are all read, including those of runs created later on
+
+	Lines that are still being written are kept until they are complete.
+	'''
+
+	def __init__(self, path):
+		self.path = path
+		self.offsets = {} # keys are ledger paths, values are (offset of the next read, incomplete last line)
+		self.paths = [] # ledgers found so far
+		self.ledger_dirs = set() # directories of these ledgers, never listed again
+		self.listings = {} # keys are the other directories, values are (modification time, subdirectories), see scan
+
+	def ledgers(self):
+		''' The paths of the ledgers to read. Only the directories that changed since the previous call are listed again.
+		'''
+		if os.path.isfile(self.path):
+			return [self.path]
+		self.scan(self.path)
+		return list(self.paths)
+
+	def scan(self, dirpath):
+		''' Look for new ledgers in a directory and its subdirectories. A directory is only listed again if its modification time changed (a run directory was added to it for instance).
+		'''
+		if dirpath in self.ledger_dirs:
+			return
+		try:
+			mtime = os.stat(dirpath).st_mtime
+		except OSError:
+			return
+		listing = self.listings.get(dirpath)
+		if listing is None or listing[0] != mtime:
+			try:
+				entries = list(os.scandir(dirpath))
+			except OSError:
+				return
+			if any( entry.name == LEDGER_NAME for entry in entries ):
+				self.ledger_dirs.add(dirpath)
+				self.paths.append(os.path.join(dirpath, LEDGER_NAME))
+				self.listings.pop(dirpath, None)
+				return
+			subdirs = [ entry.path for entry in entries if entry.name not in SKIP_DIRS and entry.is_dir() ]
+			# A directory modified within the last second may change again without its modification time changing (coarse timestamps), it is listed again next time
+			listing = (mtime if time.time() - mtime > 1. else None, subdirs)
+			self.listings[dirpath] = listing
+		for subdir in listing[1]:
+			self.scan(subdir)
+
+	def read(self):
+		''' The new events of the ledgers, as dictionnaries sorted by time. When reading a directory, the path of the ledger of every event is added under 'ledger'.
+		'''
+		events = []
+		add_path = not os.path.isfile(self.path)
+		for path in self.ledgers():
+			offset, partial = self.offsets.get(path, (0, b''))
+			try:
+				size = os.path.getsize(path)
+			except OSError:
+				continue
+			if size <= offset:
+				continue
+			with open(path, 'rb') as file:
+				file.seek(offset)
+				data = file.read(size - offset)
+			lines = (partial + data).split(b'\n')
+			self.offsets[path] = (offset + len(data), lines.pop())
+			for line in lines:
+				if len(line.strip()) == 0:
+					continue
+				event = json.loads(line)
+				if add_path:
+					event['ledger'] = path
+				events.append(event)
+		events.sort(key = lambda event : event['time'])
+		return events
+
+	def follow(self, interval = 1., stop = None):
+		''' Generator of the events as they are written, the ledgers are read every interval seconds.
+
+		# Args
+			- interval (default 1.) : seconds between two reads
+			- stop (optionnal) : a threading.Event ending the generator when set, it never ends otherwise
+		'''
+		while True:
+			for event in self.read():
+				yield event
+			if stop is None:
+				time.sleep(interval)
+			elif stop.wait(interval):
+				return
+
+def read_ledger(path):
+	''' All the events of a ledger (or of all the ledgers of a directory), see LedgerReader.
+	'''
+	return LedgerReader(path).read()
@@ -0,0 +1,210 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import weakref
+from time import perf_counter_ns
+
+from ExperimentManager.tracing import tracer
+
+'''
+Asynchronous logging backbone.
+
+Loggers set up with a LogWriter (see utils.setup_logger) only put their records in a queue, all file writes happen on the LogWriter's background thread.
+In forked child processes, where that thread does not exist, records are written synchronously.
+'''
+
+# Running writers, reset in forked children (see LogWriter.after_fork)
+writers = weakref.WeakSet()
+
+class LogWriter():
+	''' Write the records of many loggers from a single background thread.
+
+	The thread takes all the records available in the queue at once (up to batch_size), writes each of them to its handler's file and flushes every touched file once per batch.
+	Calling close will write all the remaining records before stopping the thread. After closing, records are written synchronously.
+	'''
+
+	def __init__(self, batch_size = 1024):
+
+		self.batch_size = batch_size
+
+		self.queue = queue.SimpleQueue()
+
+		# The file handlers, keys are routes (see add_handler)
+		self.handlers = {}
+		self.lock = threading.Lock()
+
+		self.closed = False
+		self.closed_lock = threading.Lock() # held while checking closed and queueing, so that nothing is queued after the stop message
+
+		self.thread = threading.Thread(target = self.monitor, name = 'ExperimentManager LogWriter', daemon = True)
+		self.thread.start()
+
+		writers.add(self)
+
+	def add_handler(self, handler):
+		''' Register a (file) handler and get the QueueHandler that should be added to the logger instead.
+		'''
+		try:
+			self.lock.acquire()
+			route = len(self.handlers)
+			self.handlers[route] = handler
+		finally:
+			self.lock.release()
+		return RoutedQueueHandler(self, route)
+
+	def put(self, record):
+		try:
+			self.closed_lock.acquire()
+			if not self.closed:
+				self.queue.put(record)
+				return
+		finally:
+			self.closed_lock.release()
+		self.write_batch([record])
+
+	def monitor(self):
+		while True:
+			batch = [self.queue.get()]
+			while len(batch) < self.batch_size:
+				try:
+					batch.append(self.queue.get_nowait())
+				except queue.Empty:
+					break
+
+			# Control messages are executed once the previous records are written
+			records = []
+			stop = False
+			for record in batch:
+				if isinstance(record, logging.LogRecord):
+					records.append(record)
+					continue
+				self.write_batch(records)
+				records = []
+				if isinstance(record, threading.Event):
+					record.set()
+				elif isinstance(record, Release):
+					self.release_files(record.routes)
+				elif record is None:
+					stop = True
+			self.write_batch(records)
+			if stop:
+				return
+
+	def write_batch(self, records):
+		start = perf_counter_ns() if tracer.enabled and len(records) > 0 else None
+		touched = {}
+		for record in records:
+			handler = self.handlers[record.route]
+			try:
+				handler.acquire()
+				if handler.stream is None:
+					handler.stream = handler._open()
+				handler.stream.write(handler.format(record) + handler.terminator)
+			except Exception:
+				handler.handleError(record)
+			finally:
+				handler.release()
+			touched[record.route] = handler
+		for handler in touched.values():
+			handler.flush()
+		if start is not None:
+			tracer.add('LogWriter.write_batch', 'logging', start, perf_counter_ns(), {'records' : len(records), 'files' : len(touched)})
+
+	def release(self, routes):
+		''' Close the files of some routes once their queued records are written. They will be reopened if needed.
+		'''
+		try:
+			self.closed_lock.acquire()
+			if not self.closed:
+				self.queue.put(Release(routes))
+				return
+		finally:
+			self.closed_lock.release()
+		self.release_files(routes)
+
+	def release_files(self, routes):
+		for route in routes:
+			handler = self.handlers[route]
+			if hasattr(handler, 'release_file'):
+				handler.release_file()
+
+	def flush(self, timeout = None):
+		''' Wait until all the records that were logged before this call are written.
+		'''
+		event = threading.Event()
+		try:
+			self.closed_lock.acquire()
+			if self.closed:
+				return
+			self.queue.put(event)
+		finally:
+			self.closed_lock.release()
+		event.wait(timeout)
+
+	def close(self):
+		''' Write all the remaining records, stop the writer thread and close the files.
+		'''
+		try:
+			self.closed_lock.acquire()
+			if self.closed:
+				return
+			self.closed = True
+			self.queue.put(None)
+		finally:
+			self.closed_lock.release()
+		self.thread.join()
+		for handler in self.handlers.values():
+			handler.close()
+
+	def after_fork(self):
+		''' Called in forked children : the writer thread only exists in the parent, so records are written synchronously (as after closing). The records queued by the parent are left to the parent.
+		'''
+		self.lock = threading.Lock()
+		self.closed_lock = threading.Lock()
+		self.queue = queue.SimpleQueue()
+		self.closed = True
+
+
+def _close_writers():
+	# A single exit hook : registering every writer with atexit would keep them (and their handlers) alive until exit
+	for writer in list(writers):
+		writer.close()
+
+atexit.register(_close_writers)
+
+def _after_fork_in_child():
+	for writer in list(writers):
+		if not writer.closed:
+			writer.after_fork()
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child = _after_fork_in_child)
+
+
+class Release():
+	''' Control message asking a LogWriter to release the files of some routes.
+	'''
+
+	def __init__(self, routes):
+		self.routes = routes
+
+
+class RoutedQueueHandler(logging.handlers.QueueHandler):
+	''' A QueueHandler that tags records with the route of their actual handler in a LogWriter.
+	'''
+
+	def __init__(self, writer, route):
+		super().__init__(None)
+		self.writer = writer
+		self.route = route
+
+	def prepare(self, record):
+		record = super().prepare(record)
+		record.route = self.route
+		return record
+
+	def enqueue(self, record):
+		self.writer.put(record)
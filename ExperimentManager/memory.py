@@ -0,0 +1,142 @@
+import os
+import threading
+import tracemalloc
+
+from ExperimentManager.utils import timestamp
+
+'''
+Memory profiling of runs.
+
+A MemoryMonitor is a run monitor (see Run.monitors) : it records the RSS at the start and end of every call, its high-water mark during the call and the top allocations (tracemalloc) that were not freed by the end of the call.
+'''
+
+MB = 1024 * 1024
+
+def current_rss():
+	''' The resident set size of the process in bytes, None if it can not be read.
+	'''
+	try:
+		with open('/proc/self/statm', 'r') as file:
+			return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+	except (OSError, ValueError, IndexError):
+		return None
+
+def peak_rss():
+	''' The high-water mark of the resident set size in bytes (since the last reset_peak_rss if it succeeded).
+	'''
+	try:
+		with open('/proc/self/status', 'r') as file:
+			for line in file:
+				if line.startswith('VmHWM:'):
+					return int(line.split()[1]) * 1024
+	except (OSError, ValueError, IndexError):
+		pass
+	try:
+		import resource
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+	except Exception:
+		return None
+
+def reset_peak_rss():
+	''' Reset the high-water mark of the resident set size (Linux only). Returns True if it succeeded.
+	'''
+	try:
+		with open('/proc/self/clear_refs', 'w') as file:
+			file.write('5')
+		return True
+	except OSError:
+		return False
+
+
+class Tracing():
+	''' Shares tracemalloc between concurrent monitors : it is started by the first one and stopped by the last one (unless it was already tracing).
+	'''
+
+	def __init__(self):
+		self.users = 0
+		self.started = False
+		self.lock = threading.Lock()
+
+	def acquire(self, nframe):
+		try:
+			self.lock.acquire()
+			if self.users == 0 and not tracemalloc.is_tracing():
+				tracemalloc.start(nframe)
+				self.started = True
+			self.users += 1
+		finally:
+			self.lock.release()
+
+	def release(self):
+		try:
+			self.lock.acquire()
+			self.users -= 1
+			if self.users == 0 and self.started:
+				tracemalloc.stop()
+				self.started = False
+		finally:
+			self.lock.release()
+
+tracing = Tracing()
+
+
+class MemoryMonitor():
+	''' Record the memory usage of the calls of a run.
+
+	# Args
+		- metrics (optionnal) : the MetricsManager of the run, the measures (in MB) are logged to its 'memory' metrics with the call id as step
+		- top (default 10) : number of allocation sites written to the run's info log
+		- threshold (optionnal) : peak RSS (in MB) above which the tracemalloc snapshot of the end of the call is dumped to memory_<call_id>.snapshot in the run directory (load it with tracemalloc.Snapshot.load)
+		- nframe (default 1) : number of frames stored by tracemalloc per allocation
+
+	Tracing allocations slows down Python code noticeably, only use it to investigate memory issues.
+	With concurrent runs, the peak RSS and the allocations are those of the whole process.
+	'''
+
+	def __init__(self, metrics = None, top = 10, threshold = None, nframe = 1):
+		self.metrics = metrics
+		self.top = top
+		self.threshold = threshold
+		self.nframe = nframe
+
+	def start(self, run, call_id):
+		tracing.acquire(self.nframe)
+		tracemalloc.reset_peak()
+		self.start_snapshot = tracemalloc.take_snapshot()
+		self.start_rss = current_rss()
+		self.peak_reset = reset_peak_rss()
+
+	def stop(self, run, call_id):
+		try:
+			end_snapshot = tracemalloc.take_snapshot()
+			traced_current, traced_peak = tracemalloc.get_traced_memory()
+		finally:
+			tracing.release()
+		end_rss = current_rss()
+		peak = peak_rss()
+
+		stats = end_snapshot.compare_to(self.start_snapshot, 'lineno')
+		traced_diff = sum( stat.size_diff for stat in stats )
+
+		to_mb = lambda x : round(x / MB, 3) if x is not None else None
+		lines = ['({}) Memory of call number {} : RSS {} MB at start, {} MB at end, {} MB peak{}. Traced python memory : {} MB peak, {:+.3f} MB not freed.'.format(
+			timestamp(), call_id, to_mb(self.start_rss), to_mb(end_rss), to_mb(peak), '' if self.peak_reset else ' (since the start of the process)', to_mb(traced_peak), traced_diff / MB)]
+		lines.append('Top {} allocations not freed during the call :'.format(self.top))
+		for stat in stats[:self.top]:
+			lines.append('    {}'.format(stat))
+
+		if self.threshold is not None and peak is not None and peak > self.threshold * MB:
+			path = os.path.join(run.run_dir, 'memory_{}.snapshot'.format(call_id))
+			end_snapshot.dump(path)
+			lines.append('Peak RSS is above the threshold of {} MB, tracemalloc snapshot dumped to {}'.format(self.threshold, path))
+		run.info_logger.info('\n'.join(lines))
+
+		if self.metrics is not None:
+			header = ['rss_start','rss_end','rss_peak','traced_peak','traced_diff']
+			values = [ to_mb(x) if x is not None else float('nan') for x in [self.start_rss, end_rss, peak, traced_peak, traced_diff] ]
+			self.metrics.log_scalars('memory', values, header = header, step = call_id)
+
+		self.start_snapshot = None
+
+	def __repr__(self):
+		return 'MemoryMonitor(top = {}, threshold = {})'.format(self.top, self.threshold)
@@ -1,11 +1,20 @@
+import json
+import logging
+import mmap
 import os
+import shutil
+import struct
 import sys
 import threading
+import time
 import traceback
 
 import numpy as np
 
-from ExperimentManager.utils import setup_logger
+from ExperimentManager.utils import setup_logger, release_logger
+from ExperimentManager.tracing import tracer
+from ExperimentManager.overhead import instrument
+from ExperimentManager.shared_counter import SharedCounter
 import ExperimentManager.tb_utils as tb_utils
 
 
@@ -16,12 +25,29 @@ class MetricsManager():
 	'''
 	
 	
-	def __init__(self,id,save_dir, tb_writer = None):
+	def __init__(self,id,save_dir, tb_writer = None, log_writer = None, multiplexed = False, buffer_size = 1024, multiprocess = False):
 	
 		self.id = id
 		
 		self.save_dir = save_dir
 		
+		# Optional LogWriter shared by all the metrics loggers of the experiment
+		self.log_writer = log_writer
+		
+		# Optional single stream for all the metrics of the run (instead of one csv per metric)
+		self.stream = MetricsStream(save_dir, log_writer = log_writer) if multiplexed else None
+		
+		# Multiprocess mode : child processes write to their own shards (shards_dir/<pid>/<metric>.csv) and auto-incremented steps are shared by all the processes
+		if multiprocess and multiplexed:
+			raise Exception('Metrics of child processes can only be written to csv files, not to a metrics stream')
+		self.shards_dir = os.path.join(save_dir,'shards') if multiprocess else None
+		if self.shards_dir is not None:
+			os.makedirs(self.shards_dir,exist_ok=True)
+		self.pid = os.getpid()
+		
+		# Number of recent values kept in memory by each metric
+		self.buffer_size = buffer_size
+		
 		self.metrics = {}
 		self.histograms = {}
 
@@ -38,7 +64,7 @@ class MetricsManager():
 		
 		try:		
 			self.lock.acquire()
-			self.metrics[name] = MetricsLogger(name,os.path.join(self.save_dir,'{}.csv'.format(name)),header = header, tb_writer = self.tb_writer)
+			self.metrics[name] = MetricsLogger(name,os.path.join(self.save_dir,'{}.csv'.format(name)),header = header, tb_writer = self.tb_writer, log_writer = self.log_writer, stream = self.stream, buffer_size = self.buffer_size, shards_dir = self.shards_dir, main_pid = self.pid)
 
 		except Exception as err:
 			traceback.print_tb(err.__traceback__)
@@ -48,6 +74,148 @@ class MetricsManager():
 		finally:		
 			self.lock.release()
 			
+	def steps(self):
+		''' The header and last auto-incremented step of every metric, {name : [header, step]}, to resume them later (see resume_metric).
+		'''
+		return { name : [metric.header, metric.counter.value if metric.counter is not None else metric.last_scalar_step] for name,metric in list(self.metrics.items()) }
+	
+	def resume_metric(self,name,header,step):
+		''' Reopen a metric that was logged by a previous process, auto-incremented steps continue after step (or after the last step of its file, if it is further). Statistics only account for the new values.
+		'''
+		if name not in self.metrics:
+			self.add_metric(name, header)
+		metric = self.metrics[name]
+		metric.continue_after(step)
+	
+	def release_files(self):
+		''' Close the files of all the metrics, they will be reopened (in append mode) on the next write.
+		'''
+		for metric in list(self.metrics.values()):
+			if metric.logger is not None:
+				release_logger(metric.logger)
+		if self.stream is not None:
+			self.stream.release()
+	
+	def read_metric(self,name):
+		''' Read back the values logged for a metric (or a file of metrics).
+		
+		# Returns
+			- header : the list of value names
+			- rows : a list of (step, wall_time, values) tuples. The wall_time is None for csv metrics.
+		'''
+		if self.stream is not None:
+			self.stream.flush()
+			return read_metric(self.save_dir, name)
+		
+		if self.log_writer is not None:
+			self.log_writer.flush()
+		path = os.path.join(self.save_dir,'{}.csv'.format(name))
+		shards = self.read_shards(name)
+		header, lines = read_csv(path) if os.path.exists(path) or name not in shards else (shards[name][0], [])
+		
+		# Values written by child processes that are not merged yet
+		if name in shards:
+			lines = sorted(lines + shards[name][1], key = lambda line : _sort_key(line[0]))
+		
+		return header, [ (step, None, [_parse(v) for v in line.split(',')[1:]]) for step, line in lines ]
+	
+	def read_shards(self, name = None):
+		''' Read the shards written by child processes in multiprocess mode.
+		
+		# Args
+			- name (optionnal) : only read the shards of this metric
+		
+		# Returns
+			- a dictionnary {metric name : (header, lines)}, lines are (step, csv line) tuples of all the shards
+		'''
+		shards = {}
+		if self.shards_dir is None or not os.path.isdir(self.shards_dir):
+			return shards
+		for pid in os.listdir(self.shards_dir):
+			shard_dir = os.path.join(self.shards_dir,pid)
+			if not pid.isdigit() or not os.path.isdir(shard_dir):
+				continue
+			for file_name in os.listdir(shard_dir):
+				if not file_name.endswith('.csv') or (name is not None and file_name != '{}.csv'.format(name)):
+					continue
+				header, lines = read_csv(os.path.join(shard_dir,file_name))
+				if file_name[:-4] not in shards:
+					shards[file_name[:-4]] = (header, [])
+				shards[file_name[:-4]][1].extend(lines)
+		return shards
+	
+	def merge_shards(self):
+		''' Merge the shards written by child processes (multiprocess mode) into the csv files of the metrics, ordered by step, and update the statistics of the metrics. The merged shards are deleted.
+		
+		Should be called once the child processes are done logging (it is called by ExperimentManager.close).
+		'''
+		shards = self.read_shards()
+		for name, (header, lines) in shards.items():
+			if name not in self.metrics:
+				self.add_metric(name, header)
+			metric = self.metrics[name]
+			if self.log_writer is not None:
+				self.log_writer.flush()
+			release_logger(metric.logger)
+			
+			_, main_lines = read_csv(metric.path)
+			lines = sorted(main_lines + lines, key = lambda line : _sort_key(line[0]))
+			with open(metric.path + '.merge','w') as file:
+				file.write('step,'+','.join(metric.header)+'\n')
+				file.write(''.join( line+'\n' for _, line in lines ))
+			os.replace(metric.path + '.merge', metric.path)
+			
+			metric.statistics = MetricStatistics(metric.header, self.buffer_size)
+			for step, line in lines:
+				metric.statistics.update(step, [_parse(v) for v in line.split(',')[1:]])
+		
+		if self.shards_dir is not None and os.path.isdir(self.shards_dir):
+			for pid in os.listdir(self.shards_dir):
+				if pid.isdigit():
+					shutil.rmtree(os.path.join(self.shards_dir,pid), ignore_errors = True)
+	
+	def close_shards(self):
+		''' Merge the shards and delete the shared step counters (multiprocess mode).
+		'''
+		if self.shards_dir is None:
+			return
+		self.merge_shards()
+		for metric in list(self.metrics.values()):
+			if metric.counter is not None:
+				metric.last_scalar_step = metric.counter.value
+				metric.counter.close()
+				metric.counter = None
+		shutil.rmtree(self.shards_dir, ignore_errors = True)
+			
+	def summary(self,name):
+		''' The streaming statistics of a metric (see MetricStatistics.summary), no file is read.
+		'''
+		return self.get_metric(name).statistics.summary()
+	
+	def tail(self,name,n = None):
+		''' The (at most) n last steps and values of a metric, kept in memory (see MetricStatistics.tail).
+		'''
+		return self.get_metric(name).statistics.tail(n)
+	
+	def get_metric(self,name):
+		if name not in self.metrics:
+			raise Exception("No metric '{}' in MetricsManager having id '{}'".format(name,self.id))
+		return self.metrics[name]
+	
+	def summaries(self):
+		''' The summaries of all the metrics, keys are the metrics names.
+		'''
+		return { name : metric.statistics.summary() for name,metric in list(self.metrics.items()) }
+	
+	def save_summaries(self):
+		''' Write the summaries of all the metrics to metrics_summary.json.
+		'''
+		if len(self.metrics) == 0:
+			return
+		summaries = self.summaries()
+		with open(os.path.join(self.save_dir,'metrics_summary.json'),'w') as file:
+			json.dump(summaries, file, indent = 4, default = str)
+	
 	def log_scalar(self,metric,value,step=None):
 	
 		if metric not in self.metrics:
@@ -66,6 +234,19 @@ class MetricsManager():
 			
 		step = self.metrics[metric].log_scalars(values,step)
 		return step
+	
+	def log_rows(self,metric,rows,header = None):
+		''' Log several measurements of a metric at once, rows is a list of (step, values) tuples (see MetricsLogger.log_rows).
+		'''
+		if len(rows) == 0:
+			return
+		
+		if metric not in self.metrics:
+			if header is None:
+				header = ['metric {}'.format(i) for i in range(len(rows[0][1]))]
+			self.add_metric(metric, header = header)
+			
+		return self.metrics[metric].log_rows(rows)
 
 
 	def log_histogram(self,name,values,step = None,bins = 1000):
@@ -84,36 +265,90 @@ class MetricsManager():
 
 class MetricsLogger():
 	
-	def __init__(self, name, path, header, tb_writer = None):
+	def __init__(self, name, path, header, tb_writer = None, log_writer = None, stream = None, buffer_size = 1024, shards_dir = None, main_pid = None):
 		
 		# The name of the metric (should be secured before calling this logger => no duplicates!)
 		self.name = name
 		
-		# The complete path to the log file (should be secured behore calling this logger)
-		self.path = path
-		
-		# The metrics logger
-		self.logger = setup_logger(self.name,self.path, format = False)
-
 		# Headers, should be a list!
 		self.header = header
-		self.logger.info('step,'+','.join(self.header))
 		
-		# History of last step for auto-incrementing
-		self.last_scalar_step = -1
-		self.last_scalar_lock = threading.Lock()
-
 		# Tensorboard support
 		self.tensorboard = tb_writer is not None
 		self.tb_writer = tb_writer
 		
+		# In memory statistics and recent values
+		self.statistics = MetricStatistics(self.header, buffer_size)
+		
+		# Multiprocess mode : steps are drawn from a counter shared by all the processes and child processes write to their own shard
+		self.shards_dir = shards_dir
+		self.counter = SharedCounter(os.path.join(shards_dir,'{}.step'.format(name))) if shards_dir is not None else None
+		self.pid = main_pid if main_pid is not None else os.getpid()
+		
+		# History of last step for auto-incrementing
+		self.last_scalar_step = -1
+		self.last_scalar_lock = threading.Lock()
+		
+		# Either a multiplexed MetricsStream shared by the run's metrics or a dedicated csv file
+		self.stream = stream
+		if self.shards_dir is not None and self.pid != os.getpid():
+			self.logger = None
+			self.open_shard()
+		elif self.stream is not None:
+			self.path = self.stream.path
+			self.logger = None
+			self.metric_id = self.stream.register(self.name, self.header)
+		else:
+			# The complete path to the log file (should be secured behore calling this logger)
+			self.path = path
+			
+			# A file left by a previous process (resumed experiment) is appended to : its header is not written again and auto-incremented steps continue after its last step
+			existing_header, last_step = read_csv_tail(self.path)
+			
+			# The metrics logger
+			self.logger = setup_logger(self.name,self.path, format = False, writer = log_writer)
+			if existing_header is None:
+				self.logger.info('step,'+','.join(self.header))
+			elif isinstance(last_step, int):
+				self.continue_after(last_step)
+		
 		# To check the coherence between calls
 		self.n_vals = len(self.header)
+	
+	def continue_after(self, step):
+		''' Make auto-incremented steps continue after step, if they are not already further.
+		'''
+		try:
+			self.last_scalar_lock.acquire()
+			self.last_scalar_step = max(self.last_scalar_step, step)
+		finally:
+			self.last_scalar_lock.release()
+		if self.counter is not None and self.counter.value < step:
+			self.counter.increment(step - self.counter.value)
+	
+	def open_shard(self):
+		''' Write to a shard of this process (multiprocess mode), called on the first write of a child process. Tensorboard is disabled in child processes and their statistics only account for their own values.
+		'''
+		self.pid = os.getpid()
+		shard_dir = os.path.join(self.shards_dir,str(self.pid))
+		os.makedirs(shard_dir,exist_ok=True)
+		self.path = os.path.join(shard_dir,'{}.csv'.format(self.name))
+		if self.logger is not None:
+			release_logger(self.logger)
+		self.logger = setup_logger('{} {}'.format(self.name,self.pid),self.path, format = False)
+		self.logger.info('step,'+','.join(self.header))
+		self.tensorboard = False
+		self.tb_writer = None
+		self.statistics = MetricStatistics(self.header, self.statistics.buffer_size)
 		
 	def verify_call(self,n_inputs):
 		assert self.n_vals == n_inputs		
+		if self.shards_dir is not None and self.pid != os.getpid():
+			self.open_shard()
 	
 	def get_step(self,step=None):
+		if step is None and self.counter is not None:
+			return self.counter.increment()
 		if step is None:
 			try: 
 				self.last_scalar_lock.acquire()
@@ -130,20 +365,408 @@ class MetricsLogger():
 		return step
 		
 		
+	@instrument('MetricsLogger.log_scalar')
 	def log_scalar(self,value,step=None):
+		start = time.perf_counter_ns() if tracer.enabled else None
 		self.verify_call(1)
 		step = self.get_step(step)
-		self.logger.info('{},{}'.format(step,value))
+		if self.stream is not None:
+			self.stream.write(self.metric_id, step, [value])
+		else:
+			self.logger.info('{},{}'.format(step,value))
+		self.statistics.update(step,[value])
+		if start is not None:
+			tracer.add('log {}'.format(self.name), 'metrics', start, time.perf_counter_ns())
 		if self.tensorboard:
 			tb_utils.log_scalar(self.tb_writer,self.name,value,step)
 		return step
 			
+	@instrument('MetricsLogger.log_scalars')
 	def log_scalars(self,values,step=None):	
+		start = time.perf_counter_ns() if tracer.enabled else None
 		self.verify_call(len(values))
 		step = self.get_step(step)
-		self.logger.info('{},{}'.format(step,','.join( str(v) for v in values)))
+		if self.stream is not None:
+			self.stream.write(self.metric_id, step, values)
+		else:
+			self.logger.info('{},{}'.format(step,','.join( str(v) for v in values)))
+		self.statistics.update(step,values)
+		if start is not None:
+			tracer.add('log {}'.format(self.name), 'metrics', start, time.perf_counter_ns())
 		if self.tensorboard:
 			for i in range(len(values)):
 				tb_utils.log_scalar(self.tb_writer,'{} {}'.format(self.name,self.header[i]),values[i],step)
 		return step
 	
+	@instrument('MetricsLogger.log_rows')
+	def log_rows(self,rows):
+		''' Log several measurements at once, with a single write. Rows are (step, values) tuples, steps can be None.
+		
+		# Returns
+			- the list of steps
+		'''
+		start = time.perf_counter_ns() if tracer.enabled else None
+		steps = []
+		for step, values in rows:
+			self.verify_call(len(values))
+			steps.append(self.get_step(step))
+		if self.stream is not None:
+			for step, (_, values) in zip(steps, rows):
+				self.stream.write(self.metric_id, step, values)
+		else:
+			self.logger.info('\n'.join( '{},{}'.format(step,','.join( str(v) for v in values)) for step, (_, values) in zip(steps, rows) ))
+		for step, (_, values) in zip(steps, rows):
+			self.statistics.update(step,values)
+			if self.tensorboard:
+				for i in range(len(values)):
+					tb_utils.log_scalar(self.tb_writer,'{} {}'.format(self.name,self.header[i]),values[i],step)
+		if start is not None:
+			tracer.add('log {}'.format(self.name), 'metrics', start, time.perf_counter_ns(), {'rows' : len(rows)})
+		return steps
+
+
+class MetricStatistics():
+	''' Streaming statistics of the values of a metric, each update is O(1).
+	
+	For every value of the header : the last value, the min and max with their steps and the mean and variance (Welford's algorithm).
+	The buffer_size last steps and values are kept in a ring buffer. Values that can not be converted to floats are not accounted for.
+	'''
+	
+	def __init__(self, header, buffer_size = 1024):
+		
+		self.header = list(header)
+		n = len(self.header)
+		
+		self.count = 0
+		self.last_step = None
+		self.mean = np.zeros(n)
+		self.m2 = np.zeros(n)
+		self.min = np.full(n, np.inf)
+		self.max = np.full(n, -np.inf)
+		self.min_steps = [None]*n
+		self.max_steps = [None]*n
+		
+		# Ring buffer, position is the index of the next write
+		self.buffer_size = buffer_size
+		self.values = np.full((buffer_size,n), np.nan)
+		self.steps = [None]*buffer_size
+		self.position = 0
+		
+		self.lock = threading.Lock()
+	
+	def update(self, step, values):
+		try:
+			values = np.asarray(values, dtype = float)
+		except (TypeError, ValueError):
+			return
+		
+		try:
+			self.lock.acquire()
+			self.count += 1
+			self.last_step = step
+			
+			delta = values - self.mean
+			self.mean += delta / self.count
+			self.m2 += delta * (values - self.mean)
+			
+			lower = values < self.min
+			if lower.any():
+				self.min[lower] = values[lower]
+				for i in np.flatnonzero(lower):
+					self.min_steps[i] = step
+			higher = values > self.max
+			if higher.any():
+				self.max[higher] = values[higher]
+				for i in np.flatnonzero(higher):
+					self.max_steps[i] = step
+			
+			if self.buffer_size > 0:
+				self.values[self.position] = values
+				self.steps[self.position] = step
+				self.position = (self.position + 1) % self.buffer_size
+		finally:
+			self.lock.release()
+	
+	def summary(self):
+		''' A dictionnary with the count and last step of the metric and, in 'values', a dictionnary per name of the header with the last, min, max, mean, variance and std of the values as well as the steps of the min and max.
+		'''
+		try:
+			self.lock.acquire()
+			last = self.values[(self.position - 1) % self.buffer_size] if self.count > 0 and self.buffer_size > 0 else [None]*len(self.header)
+			summary = { 'count' : self.count, 'last_step' : self.last_step, 'values' : {} }
+			for i,name in enumerate(self.header):
+				variance = self.m2[i] / self.count if self.count > 0 else None
+				summary['values'][name] = {
+					'last' : float(last[i]) if last[i] is not None else None,
+					'min' : float(self.min[i]) if self.count > 0 else None,
+					'min_step' : self.min_steps[i],
+					'max' : float(self.max[i]) if self.count > 0 else None,
+					'max_step' : self.max_steps[i],
+					'mean' : float(self.mean[i]) if self.count > 0 else None,
+					'variance' : float(variance) if variance is not None else None,
+					'std' : float(np.sqrt(variance)) if variance is not None else None
+				}
+			return summary
+		finally:
+			self.lock.release()
+	
+	def tail(self, n = None):
+		''' The (at most) n last values, from oldest to newest. All the buffered values are returned if n is None.
+		
+		# Returns
+			- steps : a list of steps
+			- values : a numpy array of shape (len(steps), len(header))
+		'''
+		try:
+			self.lock.acquire()
+			available = min(self.count, self.buffer_size)
+			n = available if n is None else min(n, available)
+			indices = [ (self.position - n + i) % self.buffer_size for i in range(n) ]
+			return [ self.steps[i] for i in indices ], self.values[indices].copy()
+		finally:
+			self.lock.release()
+
+
+# Records of the sidecar index of a MetricsStream : the id of a metric and the byte offset of one of its lines
+INDEX_FORMAT = '<IQ'
+INDEX_DTYPE = np.dtype([('id','<u4'),('offset','<u8')])
+
+class MetricsStream():
+	''' A single long-format file for all the metrics of a run.
+	
+	Each line of metrics.csv is "metric_id,step,wall_time,values...". Metric names (and their headers) are interned in metrics_names.jsonl, one json object per metric id.
+	The sidecar metrics.index holds the byte offset of every line in metrics.csv, so that a single metric can be read without scanning the whole file (see read_metric).
+	Files are opened on the first write and closed by release. Supports concurrency.
+	
+	If a LogWriter is given, lines are only queued and the files are written by the writer's background thread (see StreamFilesHandler).
+	'''
+	
+	def __init__(self, save_dir, log_writer = None):
+		
+		self.save_dir = save_dir
+		self.path = os.path.join(save_dir,'metrics.csv')
+		self.names_path = os.path.join(save_dir,'metrics_names.jsonl')
+		self.index_path = os.path.join(save_dir,'metrics.index')
+		
+		# Interned metric names, ids of existing metrics are kept when reopening a stream
+		self.ids = {}
+		for metric in read_names(self.names_path):
+			self.ids[metric['name']] = metric['id']
+		
+		if not os.path.exists(self.path):
+			with open(self.path,'wb') as file:
+				file.write(b'metric_id,step,wall_time,values\n')
+		
+		self.file = None
+		self.index = None
+		self.offset = None
+		
+		self.lock = threading.Lock()
+		
+		self.log_writer = log_writer
+		self.route = log_writer.add_handler(StreamFilesHandler(self)).route if log_writer is not None else None
+	
+	def register(self, name, header):
+		''' Get the id of a metric, adding it to the names dictionnary if needed.
+		'''
+		try:
+			self.lock.acquire()
+			if name not in self.ids:
+				metric_id = len(self.ids)
+				with open(self.names_path,'a') as file:
+					file.write(json.dumps({'id' : metric_id, 'name' : name, 'header' : list(header)})+'\n')
+				self.ids[name] = metric_id
+			return self.ids[name]
+		finally:
+			self.lock.release()
+	
+	def write(self, metric_id, step, values):
+		line = '{},{},{!r},{}\n'.format(metric_id, step, time.time(), ','.join( str(v) for v in values))
+		if self.log_writer is not None:
+			self.log_writer.put(logging.makeLogRecord({ 'msg' : line, 'route' : self.route }))
+		else:
+			self.append(line)
+	
+	def append(self, line):
+		''' Write a line to metrics.csv and its offset to metrics.index.
+		'''
+		metric_id = int(line[:line.find(',')])
+		line = line.encode()
+		try:
+			self.lock.acquire()
+			if self.file is None:
+				self.file = open(self.path,'ab')
+				self.index = open(self.index_path,'ab')
+				self.offset = os.path.getsize(self.path)
+			self.file.write(line)
+			self.index.write(struct.pack(INDEX_FORMAT, metric_id, self.offset))
+			self.offset += len(line)
+		finally:
+			self.lock.release()
+	
+	def flush(self):
+		''' Write the queued lines (if there is a LogWriter) and flush the files.
+		'''
+		if self.log_writer is not None:
+			self.log_writer.flush()
+		self.flush_files()
+	
+	def flush_files(self):
+		try:
+			self.lock.acquire()
+			if self.file is not None:
+				self.file.flush()
+				self.index.flush()
+		finally:
+			self.lock.release()
+	
+	def release(self):
+		''' Close the files until the next write, once the queued lines are written.
+		'''
+		if self.log_writer is not None:
+			self.log_writer.release([self.route])
+		else:
+			self.release_files()
+	
+	def release_files(self):
+		try:
+			self.lock.acquire()
+			if self.file is not None:
+				self.file.close()
+				self.index.close()
+				self.file, self.index = None, None
+		finally:
+			self.lock.release()
+
+
+class StreamFilesHandler(logging.Handler):
+	''' The handler of a MetricsStream in a LogWriter : the records are the lines of the stream, written with MetricsStream.append.
+	'''
+	
+	terminator = ''
+	
+	def __init__(self, metrics_stream):
+		super().__init__()
+		self.metrics_stream = metrics_stream
+		self.stream = None
+	
+	def _open(self):
+		return self
+	
+	def format(self, record):
+		return record.msg
+	
+	def write(self, line):
+		self.metrics_stream.append(line)
+	
+	def flush(self):
+		self.metrics_stream.flush_files()
+	
+	def release_file(self):
+		self.stream = None
+		self.metrics_stream.release_files()
+	
+	def close(self):
+		self.release_file()
+		super().close()
+
+
+def read_names(names_path):
+	''' The interned metrics of a MetricsStream, as a list of {'id','name','header'} dicts.
+	'''
+	if not os.path.exists(names_path):
+		return []
+	with open(names_path,'r') as file:
+		return [json.loads(line) for line in file if line.strip()]
+
+def read_metric(save_dir, name):
+	''' Read a single metric from the MetricsStream files of a metrics directory, using the sidecar index to only read its lines.
+	
+	# Returns
+		- header : the list of value names
+		- rows : a list of (step, wall_time, values) tuples, in logging order
+	'''
+	metric = None
+	for candidate in read_names(os.path.join(save_dir,'metrics_names.jsonl')):
+		if candidate['name'] == name:
+			metric = candidate
+			break
+	if metric is None:
+		raise Exception("No metric '{}' in the metrics stream of '{}'".format(name,save_dir))
+	
+	path = os.path.join(save_dir,'metrics.csv')
+	size = os.path.getsize(path)
+	index_path = os.path.join(save_dir,'metrics.index')
+	count = os.path.getsize(index_path) // INDEX_DTYPE.itemsize if os.path.exists(index_path) else 0
+	if count == 0:
+		return metric['header'], []
+	
+	index = np.fromfile(index_path, dtype = INDEX_DTYPE, count = count)
+	offsets = index['offset'][index['id'] == metric['id']]
+	
+	rows = []
+	with open(path,'rb') as file, mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+		for offset in offsets.tolist():
+			# Lines that were indexed but not written (interrupted process) are skipped
+			end = data.find(b'\n', offset)
+			if offset >= size or end == -1:
+				continue
+			fields = data[offset:end].decode().split(',')
+			rows.append((_parse(fields[1]), float(fields[2]), [_parse(v) for v in fields[3:]]))
+	return metric['header'], rows
+
+def read_csv(path):
+	''' Read the csv file of a metric.
+	
+	# Returns
+		- header : the list of value names
+		- lines : a list of (step, csv line) tuples
+	'''
+	with open(path,'r') as file:
+		lines = file.read().splitlines()
+	header = lines[0].split(',')[1:] if len(lines) > 0 else []
+	return header, [ (_parse(line[:line.find(',')]), line) for line in lines[1:] if len(line) > 0 ]
+
+def read_csv_tail(path, chunk_size = 4096):
+	''' Read the header and the last step of the csv file of a metric without reading the whole file. An incomplete last line (the process writing it was killed) is removed from the file.
+	
+	# Returns
+		- header : the list of value names, None if the file does not exist or is empty
+		- last_step : the step of the last line, None if there is no line after the header
+	'''
+	if not os.path.isfile(path) or os.path.getsize(path) == 0:
+		return None, None
+	with open(path,'rb+') as file:
+		header = file.readline()
+		if not header.endswith(b'\n'):
+			# Not even the header was written completely
+			file.truncate(0)
+			return None, None
+		size = file.seek(0, os.SEEK_END)
+		tail, position = b'', size
+		while position > len(header) and tail.count(b'\n') < 2:
+			position = max(len(header), position - chunk_size)
+			file.seek(position)
+			tail = file.read(size - position)
+		if not tail.endswith(b'\n') and len(tail) > 0:
+			end = tail.rfind(b'\n') + 1
+			file.truncate(position + end)
+			tail = tail[:end]
+	lines = tail.decode().splitlines()
+	header = header.decode().rstrip('\n').split(',')[1:]
+	if len(lines) == 0:
+		return header, None
+	last = lines[-1]
+	return header, _parse(last[:last.find(',')])
+
+def _sort_key(step):
+	# Steps are usually integers, other steps are sorted after them
+	return (0, step, '') if isinstance(step, (int, float)) else (1, 0, str(step))
+
+def _parse(value):
+	for cast in (int, float):
+		try:
+			return cast(value)
+		except ValueError:
+			pass
+	return value
@@ -0,0 +1,78 @@
+import functools
+import os
+import threading
+from time import perf_counter_ns
+
+'''
+Self-instrumentation : how much time the manager spends in its own hot paths (finding the current run, formatting log headers, injecting options, writing metrics, saving, capturing std).
+
+Set the environment variable EXPERIMENT_MANAGER_OVERHEAD=1 before importing ExperimentManager to enable it.
+When disabled, instrument returns the functions unchanged : the instrumentation costs nothing.
+Times are inclusive (get_options is also counted in the captured calls that use it for instance), and shared by all the experiments of the process.
+'''
+
+ENABLED = os.environ.get('EXPERIMENT_MANAGER_OVERHEAD', '0') not in ['', '0']
+
+# Number of calls and total time (in nanoseconds) per instrumented function
+counters = {}
+lock = threading.Lock()
+
+def add(name, start):
+	''' Count a call of name that started at start (a perf_counter_ns value).
+	'''
+	duration = perf_counter_ns() - start
+	try:
+		lock.acquire()
+		counter = counters.get(name)
+		if counter is None:
+			counter = counters[name] = [0, 0]
+		counter[0] += 1
+		counter[1] += duration
+	finally:
+		lock.release()
+
+def instrument(name):
+	''' Decorator counting the calls and time of a function under name, if the instrumentation is enabled.
+	'''
+	def decorator(function):
+		if not ENABLED:
+			return function
+
+		@functools.wraps(function)
+		def instrumented(*args, **kwargs):
+			start = perf_counter_ns()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				add(name, start)
+		return instrumented
+	return decorator
+
+def summary():
+	''' The counters as a dictionnary {name : {'count', 'total', 'mean'}}, times in seconds, sorted by decreasing total time.
+	'''
+	try:
+		lock.acquire()
+		items = [ (name, count, total) for name, (count, total) in counters.items() ]
+	finally:
+		lock.release()
+	items.sort(key = lambda item : -item[2])
+	return { name : { 'count' : count, 'total' : total / 1e9, 'mean' : total / count / 1e9 } for name, count, total in items }
+
+def report():
+	''' A printable table of the counters.
+	'''
+	if not ENABLED:
+		return 'Overhead instrumentation is disabled, set EXPERIMENT_MANAGER_OVERHEAD=1 before importing ExperimentManager to enable it.'
+	lines = ['ExperimentManager overhead (inclusive times, all experiments of the process) :']
+	lines.append('{:<40} {:>10} {:>12} {:>12}'.format('function','calls','total (s)','mean (us)'))
+	for name, counter in summary().items():
+		lines.append('{:<40} {:>10} {:>12.4f} {:>12.2f}'.format(name, counter['count'], counter['total'], 1e6 * counter['mean']))
+	return '\n'.join(lines)
+
+def reset():
+	try:
+		lock.acquire()
+		counters.clear()
+	finally:
+		lock.release()
@@ -0,0 +1,87 @@
+import cProfile
+import io
+import os
+import pstats
+
+from ExperimentManager.utils import pprint_dict, timestamp
+
+'''
+Deterministic profiling of runs with cProfile.
+
+A RunProfiler is a run monitor (see Run.monitors) : every call of the run is profiled and written to profile_<call_id>.pstats and profile_<call_id>.txt in the run directory.
+Profiles of several runs can be merged with aggregate_profiles (see also ExperimentManager.aggregate_profiles).
+'''
+
+class RunProfiler():
+	''' Profile the calls of a run with cProfile.
+
+	# Args
+		- config (optionnal) : the configuration of the run, written at the top of the text summaries
+		- sort (default 'cumulative') : the pstats sort key of the text summaries
+		- limit (default 100) : the number of functions listed in the text summaries
+
+	Only the thread calling the run is profiled. cProfile can not profile two runs at once (concurrent runs) : in that case the second run is not profiled and a warning is written to its log.
+	'''
+
+	def __init__(self, config = None, sort = 'cumulative', limit = 100):
+		self.config = config
+		self.sort = sort
+		self.limit = limit
+		self.profile = None
+
+	def start(self, run, call_id):
+		self.profile = cProfile.Profile()
+		try:
+			self.profile.enable()
+		except ValueError as err:
+			run.logger.warning('Could not profile call number {} : {}'.format(call_id, err))
+			self.profile = None
+
+	def stop(self, run, call_id):
+		if self.profile is None:
+			return
+		self.profile.disable()
+
+		path = os.path.join(run.run_dir, 'profile_{}'.format(call_id))
+		self.profile.dump_stats(path + '.pstats')
+
+		header = 'Profile of call number {} of run {} (id {}, command {}) ({})'.format(call_id, run.name, run.id, run.command.__name__, timestamp())
+		if self.config is not None:
+			header += '\n' + pprint_dict(self.config, output = 'return', name = 'Run config')
+		write_summary(pstats.Stats(self.profile), path + '.txt', header, sort = self.sort, limit = self.limit)
+
+		self.profile = None
+		run.info_logger.info('({}) Profile of call number {} written to {}.pstats'.format(timestamp(), call_id, path))
+
+	def __repr__(self):
+		return 'RunProfiler(sort = {})'.format(self.sort)
+
+
+def write_summary(stats, path, header = None, sort = 'cumulative', limit = 100):
+	''' Write the text summary of pstats.Stats, sorted by sort and limited to limit functions.
+	'''
+	stream = io.StringIO()
+	stats.stream = stream
+	stats.sort_stats(sort).print_stats(limit)
+	with open(path, 'w') as file:
+		if header is not None:
+			file.write(header + '\n\n')
+		file.write(stream.getvalue())
+
+def aggregate_profiles(paths, output = None, header = None, sort = 'cumulative', limit = 100):
+	''' Merge .pstats files.
+
+	# Args
+		- paths : the list of .pstats files
+		- output (optionnal) : path without extension, output.pstats and output.txt (sorted summary) will be written
+
+	# Returns
+		- the merged pstats.Stats, None if there are no paths
+	'''
+	if len(paths) == 0:
+		return None
+	stats = pstats.Stats(*paths, stream = io.StringIO())
+	if output is not None:
+		stats.dump_stats(output + '.pstats')
+		write_summary(stats, output + '.txt', header = header, sort = sort, limit = limit)
+	return stats
@@ -0,0 +1,162 @@
+import threading
+from bisect import bisect_right
+
+import numpy as np
+
+'''
+Early stopping of unpromising runs.
+
+A Pruner observes the values logged (with log_scalar) for a metric by the runs of a command and decides whether a run should stop, by comparing it to its sibling runs (the other runs of the same command).
+Pruners are added with manager.add_pruner. Once a run is pruned, manager.should_stop() returns True for that run and its next log call raises RunPruned, which stops the run with status 'Pruned'.
+'''
+
+class RunPruned(Exception):
+	''' Raised at the first log call of a run after a Pruner decided to stop it.
+	'''
+
+	def __init__(self, run_id, reason):
+		super().__init__('Run {} was pruned : {}'.format(run_id, reason))
+		self.run_id = run_id
+		self.reason = reason
+
+
+class Pruner():
+	''' Base class of the pruning rules, subclasses implement prune.
+
+	# Args
+		- metric : the name of the observed metric (as given to log_scalar)
+		- mode : 'min' if lower values are better, 'max' otherwise
+		- command : only observe the runs of this command. By default, the runs of every command are observed (and only compared to the runs of the same command).
+	'''
+
+	def __init__(self, metric, mode = 'min', command = None):
+
+		if mode not in ['min','max']:
+			raise Exception("Unknown mode '{}' for pruner, should be 'min' or 'max'".format(mode))
+
+		self.metric = metric
+		self.mode = mode
+		self.command = command
+
+		# Reported values of every run, keys are command names then run ids. Steps are increasing and bests[i] is the best value up to steps[i].
+		self.steps = {}
+		self.bests = {}
+
+		self.lock = threading.Lock()
+
+	def report(self, command, run_id, step, value):
+		''' Record a value logged by a run and decide whether it should stop.
+
+		# Returns
+			- the reason for stopping the run, or None to keep it going
+		'''
+		if self.command is not None and command != self.command:
+			return None
+		# Only numerical steps can be compared between runs
+		if not isinstance(step, (int, float)):
+			return None
+
+		try:
+			self.lock.acquire()
+			steps = self.steps.setdefault(command, {}).setdefault(run_id, [])
+			bests = self.bests.setdefault(command, {}).setdefault(run_id, [])
+			if len(steps) > 0 and step <= steps[-1]:
+				return None
+			steps.append(step)
+			bests.append(value if len(bests) == 0 else self.best(bests[-1], value))
+			return self.prune(command, run_id, step)
+		finally:
+			self.lock.release()
+
+	def prune(self, command, run_id, step):
+		raise NotImplementedError()
+
+	def best(self, a, b):
+		return min(a, b) if self.mode == 'min' else max(a, b)
+
+	def worse(self, a, b):
+		''' True if a is strictly worse than b.
+		'''
+		return a > b if self.mode == 'min' else a < b
+
+	def best_at(self, command, run_id, step):
+		''' The best value reported by a run up to a step (None if it has not reported anything yet).
+		'''
+		index = bisect_right(self.steps[command][run_id], step)
+		return self.bests[command][run_id][index-1] if index > 0 else None
+
+	def siblings(self, command, run_id, step):
+		''' The other runs of the command that reached a step.
+		'''
+		return [ other for other,steps in self.steps[command].items() if other != run_id and steps[-1] >= step ]
+
+	def __repr__(self):
+		return '{}({}, mode = {})'.format(type(self).__name__, self.metric, self.mode)
+
+
+class MedianPruner(Pruner):
+	''' Median stopping rule : stop a run if its best value so far is worse than the median of the best values of its siblings at the same step.
+
+	# Args
+		- warmup_steps : no run is pruned before this step
+		- min_runs : minimum number of siblings having reached the step to take a decision
+	'''
+
+	def __init__(self, metric, mode = 'min', command = None, warmup_steps = 0, min_runs = 2):
+		super().__init__(metric, mode = mode, command = command)
+		self.warmup_steps = warmup_steps
+		self.min_runs = min_runs
+
+	def prune(self, command, run_id, step):
+		if step < self.warmup_steps:
+			return None
+
+		siblings = self.siblings(command, run_id, step)
+		if len(siblings) < self.min_runs:
+			return None
+
+		median = float(np.median([ self.best_at(command, other, step) for other in siblings ]))
+		current = self.best_at(command, run_id, step)
+		if self.worse(current, median):
+			return 'best {} {} is worse than the median {} of {} other runs at step {}'.format(self.metric, current, median, len(siblings), step)
+		return None
+
+
+class SuccessiveHalvingPruner(Pruner):
+	''' Asynchronous successive halving : runs are compared at rungs, at steps min_step * reduction_factor ** k.
+
+	When a run reaches a rung, its best value is recorded there and it only continues if it is in the top 1 / reduction_factor of the values recorded at that rung (the first run always continues).
+
+	# Args
+		- min_step : the step of the first rung
+		- reduction_factor : the inverse of the fraction of runs promoted at each rung
+	'''
+
+	def __init__(self, metric, mode = 'min', command = None, min_step = 1, reduction_factor = 3):
+		super().__init__(metric, mode = mode, command = command)
+		self.min_step = min_step
+		self.reduction_factor = reduction_factor
+
+		# Values recorded at each rung, keys are command names then rung indices then run ids
+		self.rungs = {}
+		# Index of the next rung of every run, keys are (command, run_id)
+		self.next_rung = {}
+
+	def prune(self, command, run_id, step):
+		rungs = self.rungs.setdefault(command, {})
+		rung = self.next_rung.get((command, run_id), 0)
+
+		while step >= self.min_step * self.reduction_factor ** rung:
+			current = self.best_at(command, run_id, step)
+			values = rungs.setdefault(rung, {})
+			values[run_id] = current
+
+			ranked = sorted(values.values(), reverse = self.mode == 'max')
+			promoted = max(1, len(ranked) // self.reduction_factor)
+			if self.worse(current, ranked[promoted-1]):
+				return 'best {} {} is not in the top {} of the {} runs at rung {} (step {})'.format(self.metric, current, promoted, len(ranked), rung, self.min_step * self.reduction_factor ** rung)
+
+			rung += 1
+			self.next_rung[(command, run_id)] = rung
+
+		return None
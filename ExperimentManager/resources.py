@@ -0,0 +1,151 @@
+import os
+import threading
+from time import monotonic
+
+'''
+Sampling of the system resources used by the process (CPU, memory, threads, I/O and open files).
+
+A ResourceSampler reads /proc/self every interval seconds from a background thread and logs the readings as the 'resources' metrics of the active runs.
+Readings are buffered and written batch_size rows at a time (and when a run ends).
+'''
+
+MB = 1024 * 1024
+
+HEADER = ['cpu_percent','cpu_time','rss_mb','threads','read_mb','write_mb','open_fds']
+
+def read_resources():
+	''' Read the resources used by the process. Values that can not be read are NaN.
+
+	# Returns
+		- a dictionnary with the cpu_time (user + system, in seconds), rss_mb, threads, read_mb and write_mb (storage I/O since the start of the process) and open_fds
+	'''
+	nan = float('nan')
+	readings = dict.fromkeys(['cpu_time','rss_mb','threads','read_mb','write_mb','open_fds'], nan)
+
+	times = os.times()
+	readings['cpu_time'] = times.user + times.system
+
+	try:
+		with open('/proc/self/stat', 'r') as file:
+			stat = file.read()
+		# Fields after the command name, which can contain spaces : state is the first one, num_threads the 18th
+		fields = stat[stat.rindex(')')+2:].split()
+		readings['threads'] = int(fields[17])
+	except (OSError, ValueError, IndexError):
+		readings['threads'] = threading.active_count()
+
+	try:
+		with open('/proc/self/statm', 'r') as file:
+			readings['rss_mb'] = int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / MB
+	except (OSError, ValueError, IndexError):
+		pass
+
+	try:
+		with open('/proc/self/io', 'r') as file:
+			for line in file:
+				key, value = line.split(':')
+				if key == 'read_bytes':
+					readings['read_mb'] = int(value) / MB
+				elif key == 'write_bytes':
+					readings['write_mb'] = int(value) / MB
+	except (OSError, ValueError):
+		pass
+
+	try:
+		readings['open_fds'] = len(os.listdir('/proc/self/fd'))
+	except OSError:
+		pass
+
+	return readings
+
+
+class ResourceSampler():
+	''' Log the resources used by the process to the metrics of the active runs.
+
+	# Args
+		- interval (default 1.) : seconds between two readings
+		- batch_size (default 10) : number of readings buffered per run before writing them
+
+	The step of a reading is the number of seconds since the run started. The readings are those of the whole process : with concurrent runs, all of them get the same readings.
+	'''
+
+	def __init__(self, interval = 1., batch_size = 10):
+
+		self.interval = interval
+		self.batch_size = batch_size
+
+		# Active runs, keys are run ids and values are [MetricsManager, start time, buffered rows]
+		self.runs = {}
+		self.lock = threading.Lock()
+
+		self.last_reading = None # (time, cpu_time) of the previous reading, to compute the cpu usage
+
+		self.stopped = threading.Event()
+		self.thread = threading.Thread(target = self.monitor, name = 'ExperimentManager ResourceSampler', daemon = True)
+		self.thread.start()
+
+	def add_run(self, run_id, metrics):
+		try:
+			self.lock.acquire()
+			self.runs[run_id] = [metrics, monotonic(), []]
+		finally:
+			self.lock.release()
+
+	def remove_run(self, run_id):
+		''' Stop sampling for a run and write its buffered readings.
+		'''
+		try:
+			self.lock.acquire()
+			entry = self.runs.pop(run_id, None)
+		finally:
+			self.lock.release()
+		if entry is not None:
+			self.write(entry)
+
+	def monitor(self):
+		while not self.stopped.wait(self.interval):
+			self.sample()
+
+	def sample(self):
+		try:
+			self.lock.acquire()
+			if len(self.runs) == 0:
+				self.last_reading = None
+				return
+		finally:
+			self.lock.release()
+
+		now = monotonic()
+		readings = read_resources()
+		if self.last_reading is not None:
+			readings['cpu_percent'] = 100 * (readings['cpu_time'] - self.last_reading[1]) / max(now - self.last_reading[0], 1e-9)
+		else:
+			readings['cpu_percent'] = float('nan')
+		self.last_reading = (now, readings['cpu_time'])
+		values = [ round(readings[key], 3) for key in HEADER ]
+
+		full = []
+		try:
+			self.lock.acquire()
+			for entry in self.runs.values():
+				entry[2].append((round(now - entry[1], 3), values))
+				if len(entry[2]) >= self.batch_size:
+					full.append(list(entry))
+					entry[2] = []
+		finally:
+			self.lock.release()
+		for entry in full:
+			self.write(entry)
+
+	def write(self, entry):
+		metrics, _, rows = entry
+		if len(rows) > 0:
+			metrics.log_rows('resources', rows, header = HEADER)
+
+	def close(self):
+		''' Stop the sampling thread and write the buffered readings of the active runs.
+		'''
+		self.stopped.set()
+		self.thread.join()
+		for run_id in list(self.runs):
+			self.remove_run(run_id)
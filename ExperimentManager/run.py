@@ -6,7 +6,10 @@ import traceback
 
 import superjson
 
-from ExperimentManager.utils import pprint_dict, timestamp
+from ExperimentManager.utils import timestamp
+from ExperimentManager.pruning import RunPruned
+from ExperimentManager.tracing import tracer
+from ExperimentManager.ledger import format_event, args_hash
 
 
 class Run():
@@ -15,10 +18,12 @@ class Run():
 	The actual run metrics and saving utilities are managed globally by an ExperimentManager.	
 	'''
 
-	def __init__(self,run_id, name,command, logger, info_logger, run_dir, save_dir, metrics_dir, tb_dir):
+	def __init__(self,run_id, name,command, logger, info_logger, run_dir, save_dir, metrics_dir, tb_dir, ledger = None, command_name = None):
 	
 		self.command = command
-		"""The command that should be run"""
+		"""The command that should be run, None until it is resolved for runs of a resumed experiment (see ExperimentManager.resume)"""
+		
+		self.command_name = command_name if command_name is not None else command.__name__
 	
 		self.id = run_id
 		"""The ID of this run as assigned by the experiment Manager"""
@@ -37,12 +42,21 @@ class Run():
 
 		self.info_logger = info_logger
 
+		self.ledger = ledger
+		"""Logger of the run's events (see ledger), one json object per line"""
+
 		self.results = {}
 
 		self.status = None
 
+		self.pruned = None
+		"""The reason why a Pruner stopped this run, if it did"""
+
 		self.calls_info = {}
 		self.calls_lock = threading.Lock()
+
+		self.monitors = []
+		"""Objects having start(run, call_id) and stop(run, call_id) methods, called around every call of the command (see profiling.RunProfiler)"""
 		
 	def increment_calls(self):
 		''' A safe way of increment the number of calls that this run performed. Will return the increment value.
@@ -61,7 +75,12 @@ class Run():
 			self.calls_lock.release()
 
 		return id
-		
+	
+	def log_event(self, event, **fields):
+		''' Append an event to the run's ledger (see ledger.format_event).
+		'''
+		if self.ledger is not None:
+			self.ledger.info(format_event(event, run_id = self.id, run = self.name, **fields))
 		
 	def __call__(self,*args,**kwargs):
 		''' Call the run's command while keeping track of the run time and automatically logging the event.
@@ -72,19 +91,37 @@ class Run():
 		call_id = self.increment_calls()
 		self.calls_info[call_id]['start_time'] = timestamp()
 		self.logger.info('({}) Starting call number {} with *args {} and **kwargs {}'.format(self.calls_info[call_id]['start_time'],call_id,args,kwargs))
+		self.log_event('start', call_id = call_id, args = args_hash(args, kwargs))
 
 		# Performing the actual run
+		error = None
 		_start_time = time.time()
-		self.results[call_id] = self.command(*args,**kwargs)
-		_stop_time = time.time()
-
-		# Logging stats and info
-		self.calls_info[call_id]['stop_time'] = timestamp()
-		self.logger.info('({}) Finished call number {}'.format(self.calls_info[call_id]['stop_time'],call_id))
-		self.calls_info[call_id]['duration'] = round(_stop_time - _start_time,3)
-		self.status = 'Finished'
-		self.info_logger.info('({}) Starting call number {} with *args {} and **kwargs {}'.format(self.calls_info[call_id]['start_time'],call_id,args,kwargs))
-		self.info_logger.info(pprint_dict(self.get_config(),output='return',name='Run config after call {}'.format(call_id)))
+		try:
+			with tracer.span('Run {}'.format(self.name), 'run', {'run_id' : self.id, 'call_id' : call_id}):
+				monitors = list(self.monitors)
+				for monitor in monitors:
+					monitor.start(self, call_id)
+				try:
+					self.results[call_id] = self.command(*args,**kwargs)
+				except RunPruned:
+					self.results[call_id] = None
+				finally:
+					for monitor in reversed(monitors):
+						try:
+							monitor.stop(self, call_id)
+						except Exception as err:
+							self.logger.error('Monitor {} failed to stop with error type {} : {}'.format(monitor,type(err),err))
+		except BaseException as err:
+			error = '{}: {}'.format(type(err).__name__, err)
+			raise
+		finally:
+			# Logging stats and info, failed calls included
+			_stop_time = time.time()
+			self.status = 'Failed' if error is not None else 'Finished' if self.pruned is None else 'Pruned'
+			self.calls_info[call_id]['stop_time'] = timestamp()
+			self.logger.info('({}) {} call number {}'.format(self.calls_info[call_id]['stop_time'],self.status,call_id))
+			self.calls_info[call_id]['duration'] = round(_stop_time - _start_time,3)
+			self.log_event('stop', call_id = call_id, status = self.status, duration = self.calls_info[call_id]['duration'], error = error)
 			
 		# Useful to have for the caller!
 		return call_id
@@ -94,5 +131,5 @@ class Run():
 		'''
 		config = { key : getattr(self,key) for key in self.__dict__  if key not in ['logger','command']}
 		config['logger'] = self.logger.name
-		config['command'] = self.command.__name__
+		config['command'] = self.command_name
 		return config
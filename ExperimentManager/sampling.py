@@ -0,0 +1,84 @@
+import os
+import sys
+import threading
+from time import perf_counter
+
+from ExperimentManager.utils import timestamp
+
+'''
+Statistical profiling of runs.
+
+A StackSampler is a run monitor (see Run.monitors) : while the run is called, a watcher thread reads the stack of the calling thread (sys._current_frames) every interval seconds.
+Stacks are written to stacks_<call_id>.folded in the run directory, in the collapsed format of flamegraph.pl, speedscope or inferno ("outer;inner;innermost count" lines).
+Unlike cProfile, the sampled thread is never slowed down by function calls : the cost is that of the watcher thread, which is negligible with the default interval.
+'''
+
+class StackSampler():
+	''' Sample the stack of the thread running a run.
+
+	# Args
+		- interval (default 0.01) : seconds between two samples
+	'''
+
+	def __init__(self, interval = 0.01):
+		self.interval = interval
+
+		self.thread = None
+		self.stopped = threading.Event()
+
+		self.counts = {} # number of samples per stack, stacks are tuples of code objects from outermost to innermost
+		self.labels = {} # frame labels per code object
+		self.sampling_time = 0.
+
+	def start(self, run, call_id):
+		self.target = threading.get_ident()
+		self.counts = {}
+		self.sampling_time = 0.
+		self.start_time = perf_counter()
+		self.stopped.clear()
+		self.thread = threading.Thread(target = self.monitor, name = 'ExperimentManager StackSampler', daemon = True)
+		self.thread.start()
+
+	def monitor(self):
+		while not self.stopped.wait(self.interval):
+			start = perf_counter()
+			self.sample()
+			self.sampling_time += perf_counter() - start
+
+	def sample(self):
+		frame = sys._current_frames().get(self.target)
+		stack = []
+		while frame is not None:
+			stack.append(frame.f_code)
+			frame = frame.f_back
+		stack = tuple(reversed(stack))
+		self.counts[stack] = self.counts.get(stack, 0) + 1
+
+	def stop(self, run, call_id):
+		if self.thread is None:
+			return
+		self.stopped.set()
+		self.thread.join()
+		self.thread = None
+
+		path = os.path.join(run.run_dir, 'stacks_{}.folded'.format(call_id))
+		self.write(path)
+
+		duration = perf_counter() - self.start_time
+		samples = sum(self.counts.values())
+		run.info_logger.info('({}) {} stacks of call number {} sampled every {} seconds written to {} (sampling took {:.2f}% of the call time)'.format(timestamp(), samples, call_id, self.interval, path, 100 * self.sampling_time / max(duration, 1e-9)))
+
+	def write(self, path):
+		''' Write the collapsed stacks, one "frame;frame;frame count" line per distinct stack.
+		'''
+		with open(path, 'w') as file:
+			for stack, count in self.counts.items():
+				file.write('{} {}\n'.format(';'.join( self.label(code) for code in stack ), count))
+
+	def label(self, code):
+		if code not in self.labels:
+			self.labels[code] = '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno).replace(';', ',')
+		return self.labels[code]
+
+	def __repr__(self):
+		return 'StackSampler(interval = {})'.format(self.interval)
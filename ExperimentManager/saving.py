@@ -9,6 +9,8 @@ from numpy import save as np_save
 from superjson import json
 
 from ExperimentManager.utils import setup_logger
+from ExperimentManager.tracing import tracer
+from ExperimentManager.overhead import instrument
 
 class Saver():
 	''' A class to thoughtlessly save any object.
@@ -16,9 +18,14 @@ class Saver():
 	Implements generic saving methods and easily allows for custom methods to be added.	
 	'''
 
-	def __init__(self,verions_handler = None, **kwargs):
+	def __init__(self,verions_handler = None, versioning = 'memory', **kwargs):
 		
-		self.verions_handler = verions_handler if verions_handler is not None else VersionsHandler()
+		# 'memory' versions are only known to this process, 'file' versions are reserved on disk and safe across processes (see FileVersionsHandler)
+		if verions_handler is None:
+			if versioning not in ['memory','file']:
+				raise Exception("Unknown versioning '{}', should be 'memory' or 'file'".format(versioning))
+			verions_handler = VersionsHandler() if versioning == 'memory' else FileVersionsHandler()
+		self.verions_handler = verions_handler
 		
 		self.savers = {}
 		
@@ -46,6 +53,8 @@ class Saver():
 		return save_path
 	
 	
+	@instrument('Saver.save')
+	@tracer.span('Saver.save', 'save')
 	def save(self,obj,name,save_dir,method = None, overwrite = False, method_args = None, method_kwargs = None):
 		''' Save an object given a name and a directory in which to save. 
 		
@@ -183,6 +192,7 @@ class VersionsHandler(object):
 		
 	def get_config(self):
 		config = { 'versions' : self.versions }
+		return config
 		
 	@staticmethod
 	def from_config(config):
@@ -190,6 +200,47 @@ class VersionsHandler(object):
 		handler = VersionsHandler()
 		handler.versions = config['versions']
 		return handler
+
+
+class FileVersionsHandler(VersionsHandler):
+	''' A VersionsHandler for file paths that is safe across processes, and across machines sharing a file system.
+	
+	Versions are reserved by creating the (empty) file with O_CREAT | O_EXCL, which is atomic, even on NFS : no lock is needed and two handlers can never hand out the same path. The saving method then writes to the reserved file.
+	The last version of every name is cached so that the next reservation usually succeeds at once, instead of trying all the versions from the first one.
+	'''
+	
+	def add(self,name, return_id = False):
+		try :
+			self.lock.acquire()
+			version = self.versions[name] + 1 if name in self.versions else 0
+			while True:
+				path = self.versioned(name,version)
+				try:
+					os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+					break
+				except FileExistsError:
+					version += 1
+			self.versions[name] = version
+			output = (path,len(self)) if return_id else path
+		finally:
+			self.lock.release()
+		return output
+	
+	@staticmethod
+	def versioned(name,version):
+		''' name for version 0, "base (version).extension" otherwise.
+		'''
+		if version == 0:
+			return name
+		base, extension = os.path.splitext(name)
+		return '{} ({}){}'.format(base,version,extension)
+	
+	@staticmethod
+	def from_config(config):
+		assert 'versions' in config
+		handler = FileVersionsHandler()
+		handler.versions = dict(config['versions'])
+		return handler
 '''
 Predefined saving methods
 '''
@@ -0,0 +1,96 @@
+import mmap
+import os
+import struct
+import threading
+import weakref
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+'''
+Counters shared by processes.
+
+A SharedCounter lives in a small file mapped in memory : every thread and process opening the same file (or inheriting it through fork) increments the same value.
+Increments are made atomic by a lock on the file (fcntl.lockf, POSIX systems only, the counter is only shared by threads otherwise) and a threading lock.
+'''
+
+FORMAT = '<q'
+SIZE = struct.calcsize(FORMAT)
+
+# Open counters, their threading locks are recreated in forked children (a lock held by another thread at fork time would never be released)
+counters = weakref.WeakSet()
+
+
+class SharedCounter():
+	''' A 64 bits integer counter stored in a file.
+
+	# Args
+		- path : the counter file, created if needed
+		- initial (default -1) : value of a new counter, the first increment returns initial + 1
+	'''
+
+	def __init__(self, path, initial = -1):
+		self.path = path
+		self.lock = threading.Lock()
+
+		self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+		self.acquire()
+		try:
+			if os.fstat(self.fd).st_size < SIZE:
+				os.write(self.fd, struct.pack(FORMAT, initial))
+		finally:
+			self.release()
+		self.map = mmap.mmap(self.fd, SIZE)
+
+		counters.add(self)
+
+	def acquire(self):
+		self.lock.acquire()
+		if fcntl is not None:
+			fcntl.lockf(self.fd, fcntl.LOCK_EX, SIZE)
+
+	def release(self):
+		try:
+			if fcntl is not None:
+				fcntl.lockf(self.fd, fcntl.LOCK_UN, SIZE)
+		finally:
+			self.lock.release()
+
+	def increment(self, n = 1):
+		''' Add n to the counter and return the new value.
+		'''
+		self.acquire()
+		try:
+			value = struct.unpack_from(FORMAT, self.map)[0] + n
+			struct.pack_into(FORMAT, self.map, 0, value)
+		finally:
+			self.release()
+		return value
+
+	@property
+	def value(self):
+		return struct.unpack_from(FORMAT, self.map)[0]
+
+	def close(self):
+		if self.fd is None:
+			return
+		self.map.close()
+		os.close(self.fd)
+		self.fd = None
+		counters.discard(self)
+
+	def after_fork(self):
+		self.lock = threading.Lock()
+
+	def __repr__(self):
+		return 'SharedCounter({}, value = {})'.format(self.path, self.value if self.fd is not None else None)
+
+
+def _after_fork_in_child():
+	for counter in list(counters):
+		counter.after_fork()
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child = _after_fork_in_child)
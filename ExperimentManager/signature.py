@@ -6,6 +6,10 @@ import inspect
 from collections import OrderedDict
 import sys
 import copy
+import functools
+import types
+
+from ExperimentManager.overhead import instrument
 
 '''
 This file is directly copied from the sacred library (MIT license).
@@ -62,6 +66,24 @@ else:  # python >= 3.3
 		
 
 
+MAX_PLANS = 256
+
+
+class BindingPlan(object):
+	"""
+	Precomputed argument binding for a given call layout of a Signature.
+
+	free_params : parameters that are not explicitly passed and may be filled in from the options
+	required_params : free parameters without a default value, they must be found in the options
+	"""
+
+	__slots__ = ('free_params', 'required_params')
+
+	def __init__(self, free_params, required_params):
+		self.free_params = tuple(free_params)
+		self.required_params = tuple(required_params)
+
+
 class Signature(object):
 	"""
 	Extracts and stores information about the signature of a function.
@@ -82,11 +104,13 @@ class Signature(object):
 		self.kw_wildcard_name = kw_wildcard_name
 		self.positional_args = pos_args
 		self.kwargs = kwargs
+		self._plans = {}
 
 	def get_free_parameters(self, args, kwargs, bound=False):
 		expected_args = self._get_expected_args(bound)
 		return [a for a in expected_args[len(args):] if a not in kwargs]
 
+	@instrument('Signature.construct_arguments')
 	def construct_arguments(self, args, kwargs, options, bound=False):
 		"""
 		Construct args list and kwargs dictionary for this signature.
@@ -105,15 +129,42 @@ class Signature(object):
 			* conflicting values for a parameter in both args and kwargs
 			* there is an unfilled parameter at the end of this process
 		"""
+		plan = self._plans.get((bound, len(args), frozenset(kwargs)))
+		if plan is None:
+			plan = self._compile_plan(args, kwargs, bound)
+
+		if not plan.free_params:
+			return args, kwargs
+
+		new_kwargs = dict(kwargs)
+		for param in plan.free_params:
+			if param in options:
+				new_kwargs[param] = options[param]
+
+		missing_args = [m for m in plan.required_params if m not in new_kwargs]
+		if missing_args:
+			raise TypeError("{} is missing value(s) for {}".format(self.name, missing_args))
+		return args, new_kwargs
+
+	def _compile_plan(self, args, kwargs, bound):
+		"""
+		Check a call layout (bound, number of args, names of kwargs) once and cache the resulting BindingPlan.
+
+		Invalid layouts raise a TypeError and are never cached.
+		"""
 		expected_args = self._get_expected_args(bound)
 		self._assert_no_unexpected_args(expected_args, args)
 		self._assert_no_unexpected_kwargs(expected_args, kwargs)
 		self._assert_no_duplicate_args(expected_args, args, kwargs)
 
-		args, kwargs = self._fill_in_options(args, kwargs, options, bound)
+		free_params = self.get_free_parameters(args, kwargs, bound)
+		plan = BindingPlan(free_params, [p for p in free_params if p not in self.kwargs])
 
-		self._assert_no_missing_args(args, kwargs, bound)
-		return args, kwargs
+		if len(self._plans) >= MAX_PLANS:
+			# a **kwargs wildcard can produce an unbounded number of layouts
+			self._plans.clear()
+		self._plans[(bound, len(args), frozenset(kwargs))] = plan
+		return plan
 
 	def __unicode__(self):
 		pos_args = self.positional_args
@@ -179,3 +230,45 @@ class Signature(object):
 		missing_args = [m for m in free_params if m not in self.kwargs]
 		if missing_args:
 			raise TypeError("{} is missing value(s) for {}".format(self.name, missing_args))
+
+
+def rebind_defaults(f, sig, options):
+	"""
+	Create a static version of f in which the options are injected once and for all.
+
+	When possible, the returned function is a copy of f whose default values are replaced by the options, calling it is then exactly as fast as calling f.
+	If the options can not be expressed as default values (an option targets a positional parameter followed by parameters without defaults) or if f is not a plain Python function,
+	the returned function falls back to sig.construct_arguments with the fixed options.
+
+	Note that, unlike captured calls, injected values are shared between calls (just like regular default values).
+	"""
+	if isinstance(f, types.FunctionType):
+		code = f.__code__
+		positional = code.co_varnames[:code.co_argcount]
+		keyword_only = code.co_varnames[code.co_argcount:code.co_argcount + code.co_kwonlyargcount]
+
+		defaults = f.__defaults__ or ()
+		values = [inspect._empty] * (len(positional) - len(defaults)) + list(defaults)
+		values = [options[name] if name in options else value for name, value in zip(positional, values)]
+
+		first_default = len(values)
+		while first_default > 0 and values[first_default - 1] is not inspect._empty:
+			first_default -= 1
+
+		if not any(name in options for name in positional[:first_default]):
+			kwdefaults = dict(f.__kwdefaults__ or {})
+			kwdefaults.update({ name : options[name] for name in keyword_only if name in options })
+
+			static_function = types.FunctionType(code, f.__globals__, f.__name__, tuple(values[first_default:]), f.__closure__)
+			static_function.__kwdefaults__ = kwdefaults if kwdefaults else None
+			static_function = functools.update_wrapper(static_function, f)
+			# inspect.signature would otherwise show the signature of f instead of the rebound defaults
+			del static_function.__wrapped__
+			return static_function
+
+	@functools.wraps(f)
+	def static_function(*args, **kwargs):
+		args, kwargs = sig.construct_arguments(args, kwargs, options)
+		return f(*args, **kwargs)
+
+	return static_function
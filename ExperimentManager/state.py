@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+
+'''
+Persisted state of an experiment, used to resume it (see ExperimentManager.resume).
+
+The state is a journal, state.jsonl in the experiment directory : every change (new run, config update, end of a run) appends one small json record, so writing it never depends on the size of the experiment.
+On close, the journal is compacted into a single snapshot record. Resuming replays the records, which only needs to parse the journal.
+'''
+
+STATE_NAME = 'state.jsonl'
+
+
+class StateJournal():
+	''' Append-only journal of the state of an experiment. Supports concurrency.
+
+	# Args
+		- path : the journal file
+	'''
+
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+
+	def append(self, kind, **fields):
+		''' Append a record of type kind.
+		'''
+		line = json.dumps(dict(type = kind, **fields), separators = (',',':'), default = str) + '\n'
+		try:
+			self.lock.acquire()
+			with open(self.path, 'a') as file:
+				file.write(line)
+		finally:
+			self.lock.release()
+
+	def compact(self):
+		''' Replace the records by a single snapshot of the state they describe. The journal is replaced atomically.
+		'''
+		try:
+			self.lock.acquire()
+			state = load_state(self.path)
+			line = json.dumps(dict(type = 'snapshot', **state), separators = (',',':'), default = str) + '\n'
+			with open(self.path + '.compact', 'w') as file:
+				file.write(line)
+			os.replace(self.path + '.compact', self.path)
+		finally:
+			self.lock.release()
+
+
+def load_state(path):
+	''' Replay the records of a journal.
+
+	# Returns
+		- a dictionnary with :
+			- experiment : the name, directories and options of the experiment
+			- runs : {run_id : {'name', 'base', 'command', 'status', 'calls'}}, base is the name the run was created with (before versioning)
+			- configs : {run_id : config}, -1 is the global config
+			- metrics : {run_id : {metric name : [header, last step]}}
+	'''
+	state = { 'experiment' : None, 'runs' : {}, 'configs' : {}, 'metrics' : {} }
+	with open(path, 'r') as file:
+		for line in file:
+			# The last line may be incomplete if the process was killed while writing it
+			try:
+				record = json.loads(line)
+			except ValueError:
+				continue
+			kind = record.pop('type')
+			if kind == 'snapshot':
+				state = {
+					'experiment' : record['experiment'],
+					'runs' : { int(run_id) : run for run_id, run in record['runs'].items() },
+					'configs' : { int(run_id) : config for run_id, config in record['configs'].items() },
+					'metrics' : { int(run_id) : metrics for run_id, metrics in record['metrics'].items() }
+				}
+			elif kind == 'experiment':
+				state['experiment'] = record
+			elif kind == 'run':
+				state['runs'][record['id']] = { 'name' : record['name'], 'base' : record['base'], 'command' : record['command'], 'status' : None, 'calls' : 0 }
+			elif kind == 'config':
+				state['configs'][record['run_id']] = record['config']
+			elif kind == 'run_end':
+				state['runs'][record['id']].update(status = record['status'], calls = record['calls'])
+			elif kind == 'metrics':
+				state['metrics'][record['run_id']] = record['metrics']
+	return state
+
+
+def unserializable(value, path = ''):
+	''' The key paths ('a.b.c') of the values of a config that would not come back unchanged from the journal : values that json can not represent (numpy scalars, objects...), tuples (read back as lists) and keys that are not strings.
+	'''
+	if isinstance(value, dict):
+		paths = []
+		for key, sub_value in value.items():
+			sub_path = '{}{}'.format(path + '.' if path else '', key)
+			if not isinstance(key, str):
+				paths.append(sub_path)
+			else:
+				paths += unserializable(sub_value, sub_path)
+		return paths
+	if isinstance(value, list):
+		return [ path for item in value if len(unserializable(item, path)) > 0 ][:1]
+	if value is None or type(value) in (str, int, float, bool):
+		return []
+	return [path]
+
+
+class LazyDict(dict):
+	''' A dictionnary whose pending keys are loaded on first access : load(key) should set them (and remove them from pending).
+
+	Membership tests include the pending keys, iteration only covers the loaded ones.
+	'''
+
+	def __init__(self, data, pending, load):
+		super().__init__(data)
+		self.pending = pending
+		self.load = load
+
+	def __missing__(self, key):
+		if key not in self.pending:
+			raise KeyError(key)
+		self.load(key)
+		return dict.__getitem__(self, key)
+
+	def __contains__(self, key):
+		return dict.__contains__(self, key) or key in self.pending
@@ -1,39 +1,172 @@
+import atexit
 import logging
+import re
 import sys
+import threading
+from time import monotonic
 
-methods = ["close","flush","fileno","isatty","read","readable","readline","readlines","reconfigure","seek","seekable","tell","truncate","writable","writelines"]
+from ExperimentManager.overhead import instrument
+
+methods = ["close","fileno","isatty","read","readable","readline","readlines","reconfigure","seek","seekable","tell","truncate","writable","writelines"]
+
+# Splits a line into text and runs of backspaces
+backspaces = re.compile('(\b+)')
+
+# tqdm bars ("45%|####      |") and keras bars ("12/100 [====>.....]")
+progress_bar = re.compile(r'(?P<tqdm>\d+%\|)|(?P<keras>\d+/\d+ \[[=>.]*\])')
 
 class StreamToLogger(object):
 	"""
 	Fake file-like stream object that redirects writes to a logger instance.
+
+	Lines are assembled in a single pass : a carriage return erases the current line and a backspace erases the last character, just like on a terminal.
+	Complete lines are sent to the logger in batches : as soon as batch_size lines are waiting or when flush_interval seconds went by since the last batch.
+	Consecutive redraws of a progress bar (written on new lines) are collapsed : at most one of them is logged every progress_interval seconds, and the last one is always logged.
+	flush logs the complete lines that are waiting but keeps the last progress bar redraw collapsed (progress bars flush after every redraw), use flush_logs to log everything that is waiting.
 	"""
-	def __init__(self, logger, ref_std, log_level=logging.INFO):
+	def __init__(self, logger, ref_std, log_level=logging.INFO, batch_size = 64, flush_interval = 1., progress_interval = 10.):
 		self.logger = logger
 		self.log_level = log_level
 		self.ref_std = ref_std
-		self.buffer = ''
+
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self.progress_interval = progress_interval
+
+		self.line = [] # parts of the line being assembled
+		self.carriage_return = False # a \r was read, the line will be erased unless it is followed by a \n
+		self.pending = [] # complete lines waiting to be logged
+		self.last_flush = monotonic()
+
+		self.progress_key = None # text preceding the last progress bar and its type
+		self.progress_line = None # last redraw of that progress bar, not logged yet
+		self.progress_time = 0.
+
+		self.lock = threading.RLock()
 
 		# Inherinting the ref_stds methods
 		for attribute in methods:
 			if hasattr(self.ref_std,attribute):
 				setattr(self,attribute,getattr(self.ref_std,attribute))
 
+		atexit.register(self.flush_logs)
+
+	@instrument('StreamToLogger.write')
 	def write(self, buf):
 		self.ref_std.write(buf)
-		# for line in buf.rstrip().splitlines():
-		for line in buf.splitlines(True):
-			line  = self.buffer+line
-			self.buffer = ''
+		try:
+			self.lock.acquire()
+			pieces = buf.split('\n')
+			for index in range(len(pieces)):
+				if index > 0:
+					self.end_line()
+				if pieces[index]:
+					self.add(pieces[index])
+
+			if len(self.pending) >= self.batch_size or (len(self.pending) > 0 and monotonic() - self.last_flush >= self.flush_interval):
+				self.log_pending()
+		finally:
+			self.lock.release()
 
-			while '\r' in line:
-				line = line[line.index('\r')+1:]
+	def add(self, piece):
+		''' Add a piece of text (without line feeds) to the current line.
+		'''
+		if self.carriage_return:
+			self.carriage_return = False
+			self.line = []
 
-			while  '\b' in line:
-				i = line.index('\b')
-				line = line[:i-1]+line[i+1:]
+		# A trailing \r only erases the line if some text follows (\r\n is a regular line end)
+		carriage_return = piece[-1] == '\r'
+		if carriage_return:
+			piece = piece.rstrip('\r')
 
-			if '\n' in line:
-				self.logger.log(self.log_level, line.rstrip())
+		if '\r' in piece:
+			piece = piece[piece.rindex('\r')+1:]
+			self.line = []
 
+		if '\b' in piece:
+			for token in backspaces.split(piece):
+				if not token:
+					continue
+				if token[0] == '\b':
+					self.erase(len(token))
+				else:
+					self.line.append(token)
+		elif piece:
+			self.line.append(piece)
+
+		self.carriage_return = carriage_return
+
+	def erase(self, n):
+		''' Erase the n last characters of the current line.
+		'''
+		while n > 0 and len(self.line) > 0:
+			last = self.line[-1]
+			if len(last) <= n:
+				n -= len(last)
+				self.line.pop()
 			else:
-				self.buffer = line
+				self.line[-1] = last[:-n]
+				n = 0
+
+	def end_line(self):
+		line = ''.join(self.line).rstrip()
+		self.line = []
+		self.carriage_return = False
+
+		match = progress_bar.search(line)
+		if match is None:
+			self.end_progress()
+			self.pending.append(line)
+			return
+
+		key = (line[:match.start()], match.lastgroup)
+		if key != self.progress_key:
+			self.end_progress()
+			self.progress_key = key
+			self.progress_time = monotonic()
+			self.pending.append(line)
+			return
+
+		# Redraw of the current progress bar
+		now = monotonic()
+		if now - self.progress_time >= self.progress_interval:
+			self.progress_time = now
+			self.progress_line = None
+			self.pending.append(line)
+		else:
+			self.progress_line = line
+
+	def end_progress(self):
+		if self.progress_line is not None:
+			self.pending.append(self.progress_line)
+		self.progress_key = None
+		self.progress_line = None
+
+	def log_pending(self):
+		if len(self.pending) > 0:
+			self.logger.log(self.log_level, '\n'.join(self.pending))
+			self.pending = []
+		self.last_flush = monotonic()
+
+	def flush(self):
+		''' Log the complete lines that are waiting and flush the original stream. A collapsed progress bar redraw is kept until the bar ends (see flush_logs).
+		'''
+		try:
+			self.lock.acquire()
+			if len(self.pending) > 0:
+				self.log_pending()
+		finally:
+			self.lock.release()
+		if hasattr(self.ref_std, 'flush'):
+			self.ref_std.flush()
+
+	def flush_logs(self):
+		''' Log all complete lines, including a collapsed progress bar redraw, and flush the original stream. Called on exit and when the experiment is closed.
+		'''
+		try:
+			self.lock.acquire()
+			self.end_progress()
+		finally:
+			self.lock.release()
+		self.flush()
@@ -1,5 +1,9 @@
-from time import time
-from threading import Lock
+import functools
+import random
+from time import time, perf_counter_ns
+from threading import Lock, local
+
+from ExperimentManager.tracing import tracer
 
 '''
 #Description
@@ -41,12 +45,31 @@ Timer summary:
 -- origin: 1560152644.2148
 -- doing something 1: 1560152645.216
 -- doing all things: 1560152649.2207   
+
+#Profiler
+A Profiler aggregates the durations of nested named sections instead of printing them : count, total, mean, p50, p95 and max per section path (such as 'epoch.batch.forward').
+It is meant to stay enabled in training loops, each section costs a couple of perf_counter_ns calls. Profilers are safe for concurrency, each thread has its own stack of sections.
+
+```
+profiler = get_profiler('training')
+for epoch in range(10):
+    with profiler('epoch'):
+        for batch in batches:
+            with profiler('forward'):
+                ...
+@profiler.section('evaluate')
+def evaluate():
+    ...
+print(profiler.report())
+profiler.dump(manager) # logs one line of statistics per section to the metrics of the current run
+```
 '''
 
 class TimerManager():
 
     def __init__(self):
         self.timers = {}
+        self.profilers = {}
         self.lock = Lock()
 
 manager = TimerManager()
@@ -148,4 +171,168 @@ class Timer():
         return None
 
     def __call__(self,*args):
-        self.step(*args)
\ No newline at end of file
+        self.step(*args)
+
+
+def get_profiler(name, reservoir_size = 1024):
+    ''' Create a new Profiler or get the one that already exists with this name, like get_timer.
+    '''
+    try:
+        manager.lock.acquire()
+        if name not in manager.profilers:
+            manager.profilers[name] = Profiler(name, reservoir_size)
+        return manager.profilers[name]
+    finally:
+        manager.lock.release()
+
+class Profiler():
+    ''' Aggregated timings of nested named sections, measured with perf_counter_ns.
+
+    # Args:
+        - name (optionnal) : the profiler name
+        - reservoir_size (default 1024) : number of durations sampled per section (uniformly, using reservoir sampling) to estimate the percentiles
+
+    Use profiler(section_name) or profiler.section(section_name) as a context manager or as a decorator. Sections opened inside another section are recorded under the path 'parent.child'.
+    Safe for concurrency.
+    '''
+
+    def __init__(self, name = None, reservoir_size = 1024):
+        self.name = name
+        self.reservoir_size = reservoir_size
+        self.sections = {} # SectionStats per section path
+        self.random = random.Random() # own generator for the reservoirs, so that profiling does not consume the user's (seeded) random stream
+        self.lock = Lock()
+        self.local = local() # stack of (path, start time) of the sections opened by each thread
+
+    def section(self, name):
+        return Section(self, name)
+
+    def __call__(self, name):
+        return Section(self, name)
+
+    def enter(self, name):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        path = name if len(stack) == 0 else stack[-1][0] + '.' + name
+        stack.append((path, perf_counter_ns()))
+
+    def exit(self):
+        stop = perf_counter_ns()
+        path, start = self.local.stack.pop()
+        self.add(path, stop - start)
+        if tracer.enabled:
+            tracer.add(path, 'profiler', start, stop)
+
+    def add(self, path, duration):
+        ''' Record a duration (in nanoseconds) for a section path.
+        '''
+        try:
+            self.lock.acquire()
+            if path not in self.sections:
+                self.sections[path] = SectionStats(self.reservoir_size, self.random)
+            self.sections[path].add(duration)
+        finally:
+            self.lock.release()
+
+    def summary(self):
+        ''' Statistics of every section path, durations are in seconds.
+
+        # Returns
+            - a dictionnary {path : {'count', 'total', 'mean', 'p50', 'p95', 'max'}}, paths are sorted
+        '''
+        try:
+            self.lock.acquire()
+            return { path : self.sections[path].summary() for path in sorted(self.sections) }
+        finally:
+            self.lock.release()
+
+    def report(self):
+        ''' A printable table of the summary.
+        '''
+        lines = ['Profiler{} summary (seconds):'.format('' if self.name is None else ' - {}'.format(self.name))]
+        lines.append('{:<40} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10}'.format('section','count','total','mean','p50','p95','max'))
+        for path, stats in self.summary().items():
+            lines.append('{:<40} {:>8} {:>10.4g} {:>10.4g} {:>10.4g} {:>10.4g} {:>10.4g}'.format(path, stats['count'], stats['total'], stats['mean'], stats['p50'], stats['p95'], stats['max']))
+        return '\n'.join(lines)
+
+    def dump(self, metrics, step = None, prefix = 'profile'):
+        ''' Log the summary of every section with metrics.log_scalars, as metrics named prefix.path.
+
+        metrics can be an ExperimentManager (the statistics go to the metrics directory of the current run) or a MetricsManager.
+        '''
+        header = ['count','total','mean','p50','p95','max']
+        for path, stats in self.summary().items():
+            name = path if prefix is None else '{}.{}'.format(prefix, path)
+            metrics.log_scalars(name, [ stats[key] for key in header ], header = header, step = step)
+
+    def reset(self):
+        try:
+            self.lock.acquire()
+            self.sections = {}
+        finally:
+            self.lock.release()
+
+class Section():
+    ''' A named section of a Profiler, usable as a context manager or as a decorator.
+    '''
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.enter(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.exit()
+        return False
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            self.profiler.enter(self.name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.profiler.exit()
+        return profiled
+
+class SectionStats():
+    ''' Count, total and max of the durations of a section, with a uniform sample of them for percentiles.
+    '''
+
+    __slots__ = ['count', 'total', 'max', 'reservoir', 'reservoir_size', 'random']
+
+    def __init__(self, reservoir_size, generator = None):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.reservoir = []
+        self.reservoir_size = reservoir_size
+        self.random = generator if generator is not None else random.Random()
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        if len(self.reservoir) < self.reservoir_size:
+            self.reservoir.append(duration)
+        else:
+            index = self.random.randrange(self.count)
+            if index < self.reservoir_size:
+                self.reservoir[index] = duration
+
+    def summary(self):
+        sample = sorted(self.reservoir)
+        percentile = lambda q : sample[min(len(sample) - 1, int(q * len(sample)))] / 1e9 if len(sample) > 0 else 0.
+        return {
+            'count' : self.count,
+            'total' : self.total / 1e9,
+            'mean' : self.total / self.count / 1e9 if self.count > 0 else 0.,
+            'p50' : percentile(0.5),
+            'p95' : percentile(0.95),
+            'max' : self.max / 1e9
+        }
@@ -0,0 +1,136 @@
+import functools
+import json
+import os
+import threading
+from time import perf_counter_ns
+
+'''
+Tracing of the experiment activity (runs, saves, metrics writes, captured calls and Profiler sections) as Chrome trace events.
+
+The trace file can be opened with chrome://tracing or https://ui.perfetto.dev, every thread gets its own track.
+Tracing is opt-in (manager kwarg trace = True) : when the tracer is disabled, instrumented code only checks tracer.enabled.
+'''
+
+class Tracer():
+	''' Records spans (name, category, start, duration) in per-thread buffers.
+
+	Each thread appends to its own list, so recording a span takes no lock. Buffers are only registered (once per thread) and read under the lock.
+	Experiments share the module-level tracer : it stays enabled as long as one of them traces.
+	'''
+
+	def __init__(self):
+
+		self.users = 0
+		self.enabled = False
+
+		self.origin = perf_counter_ns()
+
+		self.local = threading.local()
+		self.buffers = [] # (thread id, thread name, buffer) for every thread that recorded a span
+		self.lock = threading.Lock()
+
+	def start(self):
+		try:
+			self.lock.acquire()
+			self.users += 1
+			self.enabled = True
+		finally:
+			self.lock.release()
+
+	def stop(self):
+		try:
+			self.lock.acquire()
+			self.users = max(0, self.users - 1)
+			self.enabled = self.users > 0
+			if not self.enabled:
+				self.buffers = []
+				self.local = threading.local()
+		finally:
+			self.lock.release()
+
+	def buffer(self):
+		buffer = getattr(self.local, 'buffer', None)
+		if buffer is None:
+			buffer = self.local.buffer = []
+			thread = threading.current_thread()
+			try:
+				self.lock.acquire()
+				self.buffers.append((thread.ident, thread.name, buffer))
+			finally:
+				self.lock.release()
+		return buffer
+
+	def add(self, name, category, start, stop, args = None):
+		''' Record a span, start and stop are perf_counter_ns values.
+		'''
+		self.buffer().append((name, category, start, stop - start, args))
+
+	def span(self, name, category = 'function', args = None):
+		''' A context manager (or decorator) recording a span, it does nothing if the tracer is disabled.
+		'''
+		return Span(self, name, category, args)
+
+	def events(self):
+		''' The recorded spans as a list of Chrome trace events (complete events, times in microseconds).
+		'''
+		pid = os.getpid()
+		try:
+			self.lock.acquire()
+			buffers = [ (tid, thread_name, list(buffer)) for tid, thread_name, buffer in self.buffers ]
+		finally:
+			self.lock.release()
+
+		events = []
+		for tid, thread_name, buffer in buffers:
+			events.append({ 'name' : 'thread_name', 'ph' : 'M', 'pid' : pid, 'tid' : tid, 'args' : { 'name' : thread_name } })
+			for name, category, start, duration, args in buffer:
+				event = { 'name' : name, 'cat' : category, 'ph' : 'X', 'ts' : (start - self.origin) / 1e3, 'dur' : duration / 1e3, 'pid' : pid, 'tid' : tid }
+				if args is not None:
+					event['args'] = args
+				events.append(event)
+		return events
+
+	def save(self, path):
+		''' Write the trace-event JSON file.
+		'''
+		with open(path, 'w') as file:
+			json.dump({ 'traceEvents' : self.events(), 'displayTimeUnit' : 'ms' }, file, default = str)
+
+
+class Span():
+	''' Created by Tracer.span. As a context manager, a Span should only be entered once at a time, decorated functions can be called concurrently.
+	'''
+
+	def __init__(self, tracer, name, category, args):
+		self.tracer = tracer
+		self.name = name
+		self.category = category
+		self.args = args
+		self.start = None
+
+	def __enter__(self):
+		if self.tracer.enabled:
+			self.start = perf_counter_ns()
+		return self
+
+	def __exit__(self, *exc_info):
+		if self.start is not None:
+			self.tracer.add(self.name, self.category, self.start, perf_counter_ns(), self.args)
+			self.start = None
+		return False
+
+	def __call__(self, function):
+		@functools.wraps(function)
+		def traced(*args, **kwargs):
+			if not self.tracer.enabled:
+				return function(*args, **kwargs)
+			start = perf_counter_ns()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				self.tracer.add(self.name, self.category, start, perf_counter_ns(), self.args)
+		return traced
+
+
+# The tracer shared by all experiments
+tracer = Tracer()
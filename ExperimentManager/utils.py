@@ -7,26 +7,43 @@ import traceback
 
 import numpy as np
 
+from ExperimentManager.file_pool import PooledFileHandler
+from ExperimentManager.logging_queue import RoutedQueueHandler
+from ExperimentManager.overhead import instrument
+
 formatter = logging.Formatter('%(asctime)s - %(levelname)s -- %(message)s')
 
-def setup_logger(name, log_file = None, level=logging.INFO, format = True):
+def setup_logger(name, log_file = None, level=logging.INFO, format = True, writer = None):
 	''' Create a logger with an optional file to save to.
 	
 	Format bool specifies wether the logs should be formatted or not.
+	
+	If a LogWriter is given, the logger only queues its records and the file is written by the writer's background thread.
 	'''
 
 	if log_file is not None:
-		handler = logging.FileHandler(log_file)
+		handler = PooledFileHandler(log_file)
 		logger = logging.Logger(name)
 		if format:
 			handler.setFormatter(formatter)
 			logger.setLevel(level)
-		logger.addHandler(handler)
+		logger.addHandler(handler if writer is None else writer.add_handler(handler))
 
 	else:
 		logger = logging.Logger(name)
 		
 	return logger
+
+def release_logger(logger):
+	''' Close the log files of a logger created with setup_logger. They will be reopened (in append mode) on the next write.
+	
+	The files of loggers using a LogWriter are closed once all their queued records are written.
+	'''
+	for handler in logger.handlers:
+		if isinstance(handler, RoutedQueueHandler):
+			handler.writer.release([handler.route])
+		elif isinstance(handler, PooledFileHandler):
+			handler.release_file()
 	
 def _get_options(main_dict, run_dict = None, prefixes = None):
 	''' Merge a main_dict and a specific run_dic using prefixes. 
@@ -88,54 +105,109 @@ def _get_options(main_dict, run_dict = None, prefixes = None):
 				
 	return options
 
+@instrument('get_options')
 def get_options(main_dict, run_dict = None, prefixes = None):
 	''' Merge a main_dict and a specific run_dic using prefixes. 
 	
 	The run_dict has precendence over the main_dict in case of equal keys.	
 	
-	This version keeps the structure of the original options dict when applying prefixes. We chose to keep the version that erases structure.
+	Prefixes can be a list of dot-separated key paths or a PrefixTrie compiled beforehand (prefer the latter when calling this repeatedly with the same prefixes).
+	Each prefix selects a sub-dictionnary (or value) which is added to the options using its last key as name ; a prefix ending with a point ('details.') adds all the keys of the sub-dictionnary instead.
+	Prefixes that can not be found are ignored.
+	
+	Only the selected parts of the dicts are traversed and copied.
 	'''
 	
-	options = {}
-	if run_dict is not None:
-		options = copy.deepcopy(run_dict)
-	insert_queue = [(options,main_dict)]
-	while len(insert_queue)>0:
-		host, guest = insert_queue.pop(0)
-		for key in guest:
-			if not key in host:
-				host[key] = copy.deepcopy(guest[key])
-			elif isinstance(host[key],dict) and isinstance(guest[key],dict):
-				insert_queue.append((host[key],guest[key]))
-			else:
-				# types do not match, the host should have precedence
-				pass
-				
 	if prefixes is None:
-		return options
-	
-	# We need to recover the requested elements
-	new_options = {}
-	prefixes = [ prefix.split('.') for prefix in prefixes ]
-	# CLEAN FOR REDUNDANT PREFIXES ?
-	# This version should check that there will not be two same keys in the newdict
-	for prefix in prefixes:
-		current = options
-		for key in prefix:
-			if key == '':
-				if prefix.index('')!=len(prefix)-1:
-					raise Exception('Double points (..) in the a prefix, does not make sense')
-				for subkey in current[key]:
-					new_options[subkey] = current[subkey]
-				current = None
-				break
-			elif key in current:
-				current = current[key]
-		if current is not None:
-			new_options[prefix[-1]] = current
-			
-	return new_options
+		return _merge(_missing if run_dict is None else run_dict, main_dict)
 	
+	if not isinstance(prefixes, PrefixTrie):
+		prefixes = PrefixTrie(prefixes)
+	return prefixes.select(main_dict, run_dict)
+
+
+_missing = object()
+_atomic_types = (int, float, complex, bool, str, bytes, type(None))
+
+def shareable(options):
+	''' True if options only holds atomic values (numbers, strings...) : the same options can then be handed out to several calls, get_options copies them otherwise.
+	'''
+	return all( isinstance(value, _atomic_types) for value in options.values() )
+
+def _merge(host, guest):
+	''' Return a copy of host merged with guest, host having precedence. Either can be _missing.
+	'''
+	if host is _missing:
+		host, guest = guest, _missing
+	if isinstance(host, dict) and isinstance(guest, dict):
+		merged = { key : _merge(host[key], guest.get(key, _missing)) for key in host }
+		for key in guest:
+			if not key in merged:
+				merged[key] = _merge(guest[key], _missing)
+		return merged
+	if isinstance(host, dict):
+		return { key : _merge(host[key], _missing) for key in host }
+	if isinstance(host, _atomic_types):
+		return host
+	# types do not match, the host should have precedence
+	return copy.deepcopy(host)
+
+
+class PrefixTrie():
+	''' A list of prefixes (see get_options) compiled into a trie of keys. Selecting options with it takes a single pass over the requested parts of the dicts.
+	'''
+
+	def __init__(self, prefixes):
+		self.prefixes = list(prefixes)
+		self.root = _TrieNode()
+		for index, prefix in enumerate(self.prefixes):
+			keys = prefix.split('.')
+			expand = keys[-1] == ''
+			if expand:
+				keys = keys[:-1]
+			if '' in keys:
+				raise Exception('Double points (..) in the a prefix, does not make sense')
+			node = self.root
+			for key in keys:
+				if not key in node.children:
+					node.children[key] = _TrieNode()
+				node = node.children[key]
+			node.selections.append((index, keys[-1] if len(keys) > 0 else None, expand))
+
+	def select(self, main_dict, run_dict = None):
+		''' Get the options selected by the prefixes in the merge of main_dict and run_dict (run_dict has precedence).
+		'''
+		selected = []
+		self._select(self.root, _missing if run_dict is None else run_dict, main_dict, selected)
+		# Later prefixes have precedence in case of equal names
+		selected.sort(key = lambda selection : selection[0])
+		return { name : value for _, name, value in selected }
+
+	def _select(self, node, run_value, main_value, selected):
+		for index, name, expand in node.selections:
+			value = _merge(run_value, main_value)
+			if not expand:
+				selected.append((index, name, value))
+			elif isinstance(value, dict):
+				selected += [ (index, key, sub_value) for key, sub_value in value.items() ]
+		for key, child in node.children.items():
+			child_run = run_value.get(key, _missing) if isinstance(run_value, dict) else _missing
+			child_main = main_value.get(key, _missing) if isinstance(main_value, dict) else _missing
+			if child_run is _missing and child_main is _missing:
+				continue
+			self._select(child, child_run, child_main, selected)
+
+	def __repr__(self):
+		return 'PrefixTrie({})'.format(self.prefixes)
+
+
+class _TrieNode():
+
+	__slots__ = ('children', 'selections')
+
+	def __init__(self):
+		self.children = {}
+		self.selections = []
 	
 	
 	
@@ -179,11 +251,43 @@ def timestamp():
 	'''
 	return datetime.now().strftime("%Hh%M  %d %m %Y")
 
+def allocate_dir(parent, name):
+	''' Atomically create a new directory in parent, named name or, if it already exists, name followed by a unique suffix (process id and microseconds).
+	
+	Relies on the exclusivity of mkdir : concurrent calls, even from different processes, always get distinct directories, and in constant time (no scan of the existing directories).
+	
+	# Returns
+		- the path and the name of the created directory
+	'''
+	path = os.path.join(parent, name)
+	try:
+		os.mkdir(path)
+		return path, name
+	except FileExistsError:
+		pass
+	while True:
+		unique_name = '{} ({}.{:06d})'.format(name, os.getpid(), datetime.now().microsecond)
+		path = os.path.join(parent, unique_name)
+		try:
+			os.mkdir(path)
+			return path, unique_name
+		except FileExistsError:
+			continue
+
 def datestamp():
 	''' Generate a custom timestamp.
 	'''
 	return datetime.now().strftime("%d %m %Y")
 
+def stack_frames(frame):
+	''' The frames of the stack, from frame to the outermost one. Like inspect.stack but without reading the source files, which makes it much faster.
+	'''
+	frames = []
+	while frame is not None:
+		frames.append(frame)
+		frame = frame.f_back
+	return frames
+
 curr_dir = os.path.dirname(os.path.abspath(inspect.getfile(default_args)))
 
 def print_clean_stack(err):
@@ -14,6 +14,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/victorruelle/ExperimentManager",
     packages=setuptools.find_packages(),
+    package_data={'ExperimentManager': ['benchmarks/baseline.json']},
     install_requires=[
           'superjson',
           'wrapt',